@@ -0,0 +1,216 @@
+import asyncio
+import contextlib
+import functools
+import logging
+import os
+import time
+from typing import Callable, Dict, Any, Optional
+
+import chainlit as cl
+from chainlit.config import config
+
+logger = logging.getLogger(__name__)
+
+# Sustained requests per second and burst size, per session and for the whole worker
+ADMISSION_SESSION_RATE = float(os.environ.get("ADMISSION_SESSION_RATE", 2))
+ADMISSION_SESSION_BURST = int(os.environ.get("ADMISSION_SESSION_BURST", 6))
+ADMISSION_GLOBAL_RATE = float(os.environ.get("ADMISSION_GLOBAL_RATE", 200))
+ADMISSION_GLOBAL_BURST = int(os.environ.get("ADMISSION_GLOBAL_BURST", 400))
+# Requests running at once, per session and in total
+ADMISSION_SESSION_CONCURRENCY = int(os.environ.get("ADMISSION_SESSION_CONCURRENCY", 1))
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", 64))
+# Requests allowed to wait for a slot, per session and in total; beyond that they are rejected
+ADMISSION_SESSION_QUEUE = int(os.environ.get("ADMISSION_SESSION_QUEUE", 3))
+ADMISSION_MAX_QUEUED = int(os.environ.get("ADMISSION_MAX_QUEUED", 256))
+# Requests over the rate are deferred by up to this long, and rejected if they'd wait longer
+ADMISSION_MAX_DEFER_SECONDS = float(os.environ.get("ADMISSION_MAX_DEFER_SECONDS", 2))
+
+REJECTED_MESSAGE = "You're sending requests faster than they can be handled. Please wait a moment."
+
+
+class Rejected(Exception):
+    """Raised when a request cannot be admitted"""
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity`"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def reserve(self) -> float:
+        """Take a token, returning how many seconds until it is actually available"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        self.tokens += 1
+
+
+class SessionState:
+    __slots__ = ("bucket", "slots", "queued", "running", "active", "used")
+
+    def __init__(self):
+        self.bucket = TokenBucket(ADMISSION_SESSION_RATE, ADMISSION_SESSION_BURST)
+        self.slots = asyncio.Semaphore(ADMISSION_SESSION_CONCURRENCY)
+        self.queued = 0
+        self.running = 0
+        # Coalescing keys of requests admitted and not yet finished
+        self.active: set = set()
+        self.used = time.monotonic()
+
+    @property
+    def busy(self) -> bool:
+        return bool(self.queued or self.running or self.active)
+
+
+class AdmissionController:
+    """Rate limits and bounds the work sessions can put on this worker
+
+    A request first takes a token from its session's bucket and from the
+    global one; if either is empty it is deferred briefly or rejected. It then
+    waits for a session slot and a global slot, with bounded queues in front
+    of both. Holding the session slot before queueing for a global one means
+    a single busy session occupies at most one place in the global queue.
+
+    A session's state outlives its socket: Chainlit ends the chat on every
+    disconnect, and forgetting the state then would let a client reset its
+    limits by reconnecting. It is dropped once the session's uploads are
+    evicted, or after the session timeout without requests.
+    """
+
+    def __init__(self):
+        self.bucket = TokenBucket(ADMISSION_GLOBAL_RATE, ADMISSION_GLOBAL_BURST)
+        self.slots = asyncio.Semaphore(ADMISSION_MAX_IN_FLIGHT)
+        self.sessions: Dict[str, SessionState] = {}
+        self.queued = 0
+        self.running = 0
+        self.counters = {"admitted": 0, "deferred": 0, "rejected": 0, "coalesced": 0, "expired": 0}
+        self._expired_at = time.monotonic()
+
+    def _reserve(self, state: SessionState) -> float:
+        """Seconds to defer the request by; raises Rejected if that would be too long"""
+        wait = state.bucket.reserve()
+        global_wait = self.bucket.reserve()
+        if max(wait, global_wait) > ADMISSION_MAX_DEFER_SECONDS:
+            self._refund(state)
+            raise Rejected()
+        return max(wait, global_wait)
+
+    def _refund(self, state: SessionState):
+        """Return the tokens of a request that was rejected after reserving them"""
+        state.bucket.refund()
+        self.bucket.refund()
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, state: SessionState):
+        if state.queued >= ADMISSION_SESSION_QUEUE or self.queued >= ADMISSION_MAX_QUEUED:
+            # The request never ran, so it shouldn't count against the rate
+            self._refund(state)
+            raise Rejected()
+        state.queued += 1
+        self.queued += 1
+        try:
+            await state.slots.acquire()
+            try:
+                await self.slots.acquire()
+            except BaseException:
+                state.slots.release()
+                raise
+        finally:
+            state.queued -= 1
+            self.queued -= 1
+        self.running += 1
+        state.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            state.running -= 1
+            self.slots.release()
+            state.slots.release()
+
+    def guard(self, coalesce_key: Optional[Callable[..., Any]] = None):
+        """Decorator admitting an async handler through the controller
+
+        `coalesce_key(*args, **kwargs)` identifies duplicate requests: while one with the
+        same key is queued or running for a session, repeats are dropped.
+        """
+
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                session_id = cl.context.session.id
+                state = self.sessions.get(session_id)
+                if state is None:
+                    self._expire_idle()
+                    state = self.sessions[session_id] = SessionState()
+                state.used = time.monotonic()
+                key = coalesce_key(*args, **kwargs) if coalesce_key else None
+                if key is not None and key in state.active:
+                    self.counters["coalesced"] += 1
+                    return None
+
+                if key is not None:
+                    state.active.add(key)
+                try:
+                    wait = self._reserve(state)
+                    if wait:
+                        self.counters["deferred"] += 1
+                        await asyncio.sleep(wait)
+                    async with self._slot(state):
+                        self.counters["admitted"] += 1
+                        return await func(*args, **kwargs)
+                except Rejected:
+                    self.counters["rejected"] += 1
+                    logger.debug("Rejected %s for session %s", func.__name__, session_id)
+                    await cl.context.emitter.send_toast(REJECTED_MESSAGE, "warning")
+                    return None
+                finally:
+                    if key is not None:
+                        state.active.discard(key)
+
+            return wrapper
+
+        return decorator
+
+    def forget(self, session_id: str):
+        """Drop a finished session's buckets, unless it still has requests in flight"""
+        state = self.sessions.get(session_id)
+        if state is not None and not state.busy:
+            del self.sessions[session_id]
+
+    def _expire_idle(self):
+        """Drop sessions idle for longer than the session timeout; checked at most once a minute"""
+        now = time.monotonic()
+        if now - self._expired_at < 60:
+            return
+        self._expired_at = now
+        before = now - config.project.session_timeout
+        for session_id in [session_id for session_id, state in self.sessions.items() if state.used < before and not state.busy]:
+            del self.sessions[session_id]
+            self.counters["expired"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "running": self.running,
+            "queued": self.queued,
+            "sessions": len(self.sessions),
+            **self.counters,
+        }
+
+
+admission = AdmissionController()
+
+
+def action_key(action: cl.Action) -> str:
+    """Repeated clicks on the same action coalesce"""
+    return action.name
@@ -0,0 +1,29 @@
+import asyncio
+from typing import Awaitable, List, Union
+
+import chainlit as cl
+
+import metrics
+
+Part = Union[cl.Message, Awaitable[cl.Message]]
+
+
+async def _ready(message: cl.Message) -> cl.Message:
+    return message
+
+
+async def send_batch(*parts: Part) -> List[cl.Message]:
+    """Send a multi-part response
+
+    Parts given as coroutines are prepared concurrently; the resulting
+    messages are then sent back to back in the order given, so the client
+    sees them as one ordered burst instead of several round trips.
+    """
+    messages = await asyncio.gather(*(
+        _ready(part) if isinstance(part, cl.Message) else part
+        for part in parts
+    ))
+    metrics.record_elements(element for message in messages for element in message.elements or [])
+    for message in messages:
+        await message.send()
+    return messages
@@ -0,0 +1,339 @@
+"""In-process load test for main.py.
+
+Opens N simulated Chainlit websocket sessions spread over the three chat
+profiles. Each session replays the profile's starters, slash commands,
+action clicks and file uploads against the real handlers. A fake socket
+emitter JSON-encodes every outgoing event, as the real socket would.
+Reports p50/p95/p99 handler latency, messages per second and worker RSS.
+
+    uv run python benchmarks/load_test.py --sessions 500 --concurrency 100
+
+Use --max-p95-ms / --min-msgs-per-sec, or --baseline with a previous
+--output file, to turn a run into a pass/fail regression gate.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+# Scripted sessions replay at machine speed; lift the admission limits so the
+# report measures handler latency rather than deliberate deferral
+for name in ("ADMISSION_SESSION_RATE", "ADMISSION_SESSION_BURST", "ADMISSION_GLOBAL_RATE", "ADMISSION_GLOBAL_BURST"):
+    os.environ.setdefault(name, "100000")
+
+import chainlit as cl  # noqa: E402
+from chainlit.config import config  # noqa: E402
+from chainlit.context import init_ws_context  # noqa: E402
+from chainlit.session import WebsocketSession  # noqa: E402
+from chainlit.user_session import user_sessions  # noqa: E402
+
+import main  # noqa: E402
+from previews import PREVIEWS_AVAILABLE  # noqa: E402
+
+# Uploads replayed in the File Processing profile: (name, mime, size in bytes)
+UPLOADS = [
+    ("notes.txt", "text/plain", 200 * 1024),
+    ("data.json", "application/json", 50 * 1024),
+    ("photo.png", "image/png", 512 * 1024),
+    ("manual.pdf", "application/pdf", 256 * 1024),
+    ("archive.bin", "application/octet-stream", 128 * 1024),
+]
+
+# Operations replayed per profile: ("message", content, command) or ("action", name) or ("upload",)
+SCRIPTS = {
+    "UI Demo": [
+        ("message", "🎨", None),
+        ("message", "📋", None),
+        ("message", "hello", None),
+        ("message", "", "cards"),
+        ("message", "", "demo"),
+        ("action", "action_summary"),
+        ("action", "action_detail"),
+        ("action", "action_export"),
+        ("message", "⚙️", None),
+    ],
+    "Interactive Chat": [
+        ("message", "Show me interactive features", None),
+        ("message", "Demonstrate action buttons", None),
+        ("action", "action_analyze"),
+        ("action", "action_expand"),
+        ("action", "action_related"),
+    ],
+    "File Processing": [
+        ("message", "What file processing features are available?", None),
+        ("upload",),
+        ("message", "How does file upload work?", None),
+    ],
+}
+
+
+class FakeSocket:
+    """Stands in for the socket.io server: encodes events and counts them"""
+
+    def __init__(self):
+        self.events = 0
+        self.messages = 0
+        self.bytes = 0
+
+    async def emit(self, event: str, data: Any):
+        self.events += 1
+        if event == "new_message":
+            self.messages += 1
+        self.bytes += len(json.dumps(data, default=str))
+
+    async def emit_call(self, event: str, data: Any, timeout=None):
+        return None
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak RSS as a fallback (KB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def write_png(path: str, size: int):
+    """A noise image of about `size` bytes (noise doesn't compress), so thumbnailing has real work"""
+    from PIL import Image
+
+    side = math.isqrt(size // 3)
+    Image.frombytes("RGB", (side, side), os.urandom(side * side * 3)).save(path, format="PNG")
+
+
+def write_pdf(path: str, size: int):
+    """A valid PDF of text pages, about `size` bytes in total"""
+    line = b"BT /F1 10 Tf 72 %d Td (The quick brown fox jumps over the lazy dog 0123456789) Tj ET\n"
+    stream = b"".join(line % (760 - 12 * row) for row in range(60))
+    pages = max(1, size // (len(stream) + 200))
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % (4 + 2 * page) for page in range(pages)), pages),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page in range(pages):
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * page))
+        objects.append(b"<< /Length %d >>\nstream\n%sendstream" % (len(stream), stream))
+    data = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def make_upload_files(directory: str) -> List[Tuple[str, str, str]]:
+    """Write the sample uploads once; sessions share them read-only
+
+    Images and PDFs are real documents, so the thumbnail and page-render
+    paths run. Without Pillow (the "previews" extra) the image is random
+    bytes, as it would be dropped to the plain element anyway.
+    """
+    files = []
+    for name, mime, size in UPLOADS:
+        path = os.path.join(directory, name)
+        if mime == "application/pdf":
+            write_pdf(path, size)
+        elif mime.startswith("image/") and PREVIEWS_AVAILABLE:
+            write_png(path, size)
+        else:
+            with open(path, "wb") as f:
+                if mime.startswith("text/") or "json" in mime:
+                    line = b"The quick brown fox jumps over the lazy dog 0123456789\n"
+                    f.write(line * (size // len(line)))
+                else:
+                    f.write(os.urandom(size))
+        files.append((name, path, mime))
+    return files
+
+
+async def run_session(index: int, profile: str, socket: FakeSocket, uploads, latencies: Dict[str, List[float]], rounds: int):
+    """Open one session, replay its profile script `rounds` times, then close it"""
+    session = WebsocketSession(
+        id=str(uuid.uuid4()),
+        socket_id=f"load-{index}",
+        emit=socket.emit,
+        emit_call=socket.emit_call,
+        user_env={},
+        client_type="webapp",
+    )
+    # Set after construction so Chainlit doesn't look up per-profile overrides
+    session.chat_profile = profile
+    init_ws_context(session)
+
+    async def timed(label: str, coro):
+        started = time.perf_counter()
+        await coro
+        latencies[label].append((time.perf_counter() - started) * 1000)
+
+    try:
+        await timed("on_chat_start", main.start())
+        for _ in range(rounds):
+            for op in SCRIPTS[profile]:
+                if op[0] == "message":
+                    _, content, command = op
+                    message = cl.Message(content=content, author="User", type="user_message")
+                    message.command = command
+                    await timed(f"{profile}: message", main.main(message))
+                elif op[0] == "action":
+                    action = cl.Action(name=op[1], payload={})
+                    await timed(op[1], config.code.action_callbacks[op[1]](action))
+                else:
+                    message = cl.Message(content="Here are my files", author="User", type="user_message")
+                    message.elements = [cl.File(name=name, path=path, mime=mime) for name, path, mime in uploads]
+                    await timed(f"{profile}: upload", main.main(message))
+    finally:
+        user_sessions.pop(session.id, None)
+        await session.delete()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies: Dict[str, List[float]], socket: FakeSocket, elapsed: float, rss_start: float, rss_peak: float) -> Dict[str, Any]:
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        "handlers": {
+            label: {
+                "count": len(values),
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "mean_ms": statistics.fmean(values),
+            }
+            for label, values in sorted(latencies.items())
+        },
+        "overall": {
+            "operations": len(all_latencies),
+            "p50_ms": percentile(all_latencies, 50),
+            "p95_ms": percentile(all_latencies, 95),
+            "p99_ms": percentile(all_latencies, 99),
+            "elapsed_s": elapsed,
+            "ops_per_sec": len(all_latencies) / elapsed if elapsed else 0.0,
+            "msgs_per_sec": socket.messages / elapsed if elapsed else 0.0,
+            "socket_events": socket.events,
+            "socket_mb": socket.bytes / (1024 * 1024),
+            "rss_start_mb": rss_start,
+            "rss_peak_mb": rss_peak,
+        },
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"{'handler':<36} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for label, stats in report["handlers"].items():
+        print(f"{label:<36} {stats['count']:>7} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+    overall = report["overall"]
+    print()
+    print(f"operations      {overall['operations']} in {overall['elapsed_s']:.2f} s ({overall['ops_per_sec']:.1f} ops/s)")
+    print(f"latency         p50 {overall['p50_ms']:.1f} ms, p95 {overall['p95_ms']:.1f} ms, p99 {overall['p99_ms']:.1f} ms")
+    print(f"messages        {overall['msgs_per_sec']:.1f} msgs/s, {overall['socket_events']} socket events, {overall['socket_mb']:.1f} MB encoded")
+    print(f"worker RSS      {overall['rss_start_mb']:.1f} MB at start, {overall['rss_peak_mb']:.1f} MB peak")
+
+
+def check_gates(report: Dict[str, Any], args) -> List[str]:
+    """Return the list of failed regression gates"""
+    overall = report["overall"]
+    failures = []
+    if args.max_p95_ms is not None and overall["p95_ms"] > args.max_p95_ms:
+        failures.append(f"p95 {overall['p95_ms']:.1f} ms > {args.max_p95_ms} ms")
+    if args.min_msgs_per_sec is not None and overall["msgs_per_sec"] < args.min_msgs_per_sec:
+        failures.append(f"{overall['msgs_per_sec']:.1f} msgs/s < {args.min_msgs_per_sec} msgs/s")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["overall"]
+        limit = 1 + args.tolerance
+        if overall["p95_ms"] > baseline["p95_ms"] * limit:
+            failures.append(f"p95 {overall['p95_ms']:.1f} ms regressed from baseline {baseline['p95_ms']:.1f} ms")
+        if overall["msgs_per_sec"] * limit < baseline["msgs_per_sec"]:
+            failures.append(f"{overall['msgs_per_sec']:.1f} msgs/s regressed from baseline {baseline['msgs_per_sec']:.1f} msgs/s")
+        if overall["rss_peak_mb"] > baseline["rss_peak_mb"] * limit:
+            failures.append(f"peak RSS {overall['rss_peak_mb']:.1f} MB regressed from baseline {baseline['rss_peak_mb']:.1f} MB")
+    return failures
+
+
+async def run(args) -> Dict[str, Any]:
+    profiles = [profile.name for profile in main.chat_profiles]
+    socket = FakeSocket()
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    slots = asyncio.Semaphore(args.concurrency)
+    rss_start = current_rss_mb()
+    rss_peak = rss_start
+
+    async def sample_rss():
+        nonlocal rss_peak
+        while True:
+            rss_peak = max(rss_peak, current_rss_mb())
+            await asyncio.sleep(0.1)
+
+    async def limited(index: int, uploads):
+        async with slots:
+            await run_session(index, profiles[index % len(profiles)], socket, uploads, latencies, args.rounds)
+
+    with tempfile.TemporaryDirectory(prefix="chainlit-load-") as directory:
+        uploads = make_upload_files(directory)
+        sampler = asyncio.create_task(sample_rss())
+        started = time.perf_counter()
+        await asyncio.gather(*(limited(index, uploads) for index in range(args.sessions)))
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+
+    rss_peak = max(rss_peak, current_rss_mb())
+    return summarize(latencies, socket, elapsed, rss_start, rss_peak)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Simulate concurrent Chainlit sessions against main.py")
+    parser.add_argument("--sessions", type=int, default=300, help="number of sessions to open")
+    parser.add_argument("--concurrency", type=int, default=100, help="sessions active at the same time")
+    parser.add_argument("--rounds", type=int, default=1, help="times each session replays its script")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression vs. baseline (0.2 = 20%%)")
+    parser.add_argument("--max-p95-ms", type=float, help="fail if overall p95 latency exceeds this")
+    parser.add_argument("--min-msgs-per-sec", type=float, help="fail if message throughput drops below this")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    failures = check_gates(report, args)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
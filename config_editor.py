@@ -1,23 +1,162 @@
 import chainlit as cl
+from chainlit.config import config as runtime_config
+from chainlit.context import init_ws_context
 from chainlit.input_widget import Select, Switch, Slider, TextInput
+from chainlit.session import ws_sessions_id
+import metrics
+from file_utils import write_atomically
+from session_state import session_store
 import toml
+import asyncio
+import logging
 import os
+import threading
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = ".chainlit/config.toml"
+
+# Quiet period that closes a burst of settings updates, and the longest a
+# pending update may wait while updates keep arriving
+CONFIG_WRITE_DEBOUNCE = float(os.environ.get("CONFIG_WRITE_DEBOUNCE_SECONDS", 0.5))
+CONFIG_WRITE_MAX_DELAY = float(os.environ.get("CONFIG_WRITE_MAX_DELAY_SECONDS", 3.0))
+# How often each worker checks config.toml for changes saved by another worker
+CONFIG_WATCH_INTERVAL = float(os.environ.get("CONFIG_WATCH_INTERVAL_SECONDS", 2.0))
+
+# Settings widget id -> (config.toml section, key)
+SETTINGS_KEYS = {
+    "ui_name": ("UI", "name"),
+    "ui_theme": ("UI", "default_theme"),
+    "ui_layout": ("UI", "layout"),
+    "features_html": ("features", "unsafe_allow_html"),
+    "features_latex": ("features", "latex"),
+    "features_edit_message": ("features", "edit_message"),
+    "project_session_timeout": ("project", "session_timeout"),
+}
+
+# (config.toml section, key) -> (Chainlit runtime config group, attribute)
+RUNTIME_KEYS = {
+    ("UI", "name"): ("ui", "name"),
+    ("UI", "default_theme"): ("ui", "default_theme"),
+    ("UI", "layout"): ("ui", "layout"),
+    ("features", "unsafe_allow_html"): ("features", "unsafe_allow_html"),
+    ("features", "latex"): ("features", "latex"),
+    ("features", "edit_message"): ("features", "edit_message"),
+    ("project", "session_timeout"): ("project", "session_timeout"),
+}
+
+# Sections the browser reads when it loads the app; open clients only need to
+# hear about changes here (session_timeout is purely server side)
+CLIENT_SECTIONS = {"UI", "features"}
+
+# Settings that change how messages already on screen render; only these are
+# worth asking other open sessions to reload for. The rest apply on their next page load.
+RELOAD_KEYS = {("features", "unsafe_allow_html"), ("features", "latex")}
+
+# Process-wide parsed config, re-read only when the file's stat signature changes
+_config_cache = {"signature": None, "config": MappingProxyType({}), "widgets": None}
+_config_lock = threading.Lock()
+
+# Fire-and-forget notification tasks, referenced until they finish
+_notify_tasks = set()
 
 @cl.on_settings_update
 async def update_settings(settings):
     """Process when settings are updated"""
     cl.user_session.set("config_settings", settings)
+    session_store.update(cl.context.session.id, config_settings=settings)
+    
+    patch = settings_to_patch(settings)
+    if not runtime_changes(patch):
+        await cl.Message(content="⚙️ Settings unchanged.").send()
+        return
+    
+    # Only switch this worker over once the settings are on disk, so a failed
+    # write cannot leave it running settings nobody else will ever load
+    written = await save_config_to_file(settings)
+    if not await written:
+        await cl.Message(content="⚙️ Settings could not be saved; nothing was changed.").send()
+        return
+    changed = apply_runtime_settings(patch)
+    if not changed:
+        await cl.Message(content="⚙️ Settings unchanged.").send()
+        return
+    
+    # Let other open sessions know without holding up this handler
+    task = asyncio.create_task(notify_sessions(changed, cl.context.session.id))
+    _notify_tasks.add(task)
+    task.add_done_callback(_notify_tasks.discard)
     
-    # Save settings to config.toml
-    await save_config_to_file(settings)
+    labels = ", ".join(setting_label(section, key) for section, key in changed)
+    content = f"⚙️ Settings applied: {labels}."
+    if any(section in CLIENT_SECTIONS for section, _ in changed):
+        content += "\n\nRefresh the page to see appearance changes."
+    await cl.Message(content=content).send()
+
+def runtime_changes(patch: Dict[str, Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """The (section, key) pairs in a config patch that differ from Chainlit's in-process config"""
+    changed = []
+    for section, values in patch.items():
+        for key, value in values.items():
+            group, attribute = RUNTIME_KEYS[(section, key)]
+            if getattr(getattr(runtime_config, group), attribute) != value:
+                changed.append((section, key))
+    return changed
+
+def apply_runtime_settings(patch: Dict[str, Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """Apply a config patch to Chainlit's in-process config
+
+    Returns the (section, key) pairs whose value actually changed. Chainlit
+    reads these values per request, so new page loads and session timeouts
+    use them right away, without a restart.
+    """
+    changed = runtime_changes(patch)
+    for section, key in changed:
+        group, attribute = RUNTIME_KEYS[(section, key)]
+        setattr(getattr(runtime_config, group), attribute, patch[section][key])
+    return changed
+
+def setting_label(section: str, key: str) -> str:
+    """Settings panel label for a config key"""
+    labels = {widget.id: widget.label for widget in get_config_widgets()}
+    for setting_id, config_key in SETTINGS_KEYS.items():
+        if config_key == (section, key):
+            return labels.get(setting_id, key)
+    return key
+
+async def notify_sessions(changed: List[Tuple[str, str]], origin_session_id: Optional[str] = None):
+    """Toast this worker's other connected sessions if `changed` needs a reload to show"""
+    visible = [(section, key) for section, key in changed if (section, key) in RELOAD_KEYS]
+    if not visible:
+        return
+    message = "Settings updated: " + ", ".join(setting_label(section, key) for section, key in visible) + ". Refresh to apply."
+    
+    async def notify(session):
+        init_ws_context(session)
+        await cl.context.emitter.send_toast(message, "info")
     
-    await cl.Message(content="⚙️ Settings updated! Please restart the application to apply changes.").send()
+    sessions = [session for session in list(ws_sessions_id.values()) if session.id != origin_session_id]
+    results = await asyncio.gather(*(notify(session) for session in sessions), return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.warning("Could not notify session about settings change: %s", result)
 
 async def create_config_settings():
     """Create Chainlit settings editor"""
+    settings = await cl.ChatSettings(list(get_config_widgets())).send()
+    
+    return settings
+
+def get_config_widgets():
+    """Settings widgets for the current config, memoized per config snapshot"""
     current_config = load_current_config()
+    with _config_lock:
+        if _config_cache["widgets"] is not None and _config_cache["config"] is current_config:
+            return _config_cache["widgets"]
     
-    settings = await cl.ChatSettings([
+    widgets = (
         TextInput(
             id="ui_name",
             label="Assistant Name",
@@ -65,50 +204,222 @@ async def create_config_settings():
             step=300,
             description="Session retention time when connection is lost"
         )
-    ]).send()
+    )
     
-    return settings
+    with _config_lock:
+        if _config_cache["config"] is current_config:
+            _config_cache["widgets"] = widgets
+    return widgets
+
+def _config_signature():
+    """Stat signature (mtime, size, inode) of config.toml, or None if missing"""
+    try:
+        stat = os.stat(CONFIG_PATH)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+def _freeze(value):
+    """Recursively turn parsed TOML into read-only mappings and tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+def _thaw(value):
+    """Mutable deep copy of a frozen config snapshot"""
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
 
 def load_current_config():
-    """Load current config.toml"""
-    config_path = ".chainlit/config.toml"
-    if os.path.exists(config_path):
-        with open(config_path, 'r', encoding='utf-8') as f:
-            return toml.load(f)
-    return {}
-
-async def save_config_to_file(settings):
-    """Save settings to config.toml file"""
-    config = load_current_config()
-    
-    # UI settings
-    if "UI" not in config:
-        config["UI"] = {}
-    config["UI"]["name"] = settings["ui_name"]
-    config["UI"]["default_theme"] = settings["ui_theme"]
-    config["UI"]["layout"] = settings["ui_layout"]
+    """Load current config.toml as an immutable snapshot
+
+    The parsed file is cached process-wide and only re-parsed when its
+    mtime, size or inode changes.
+    """
+    signature = _config_signature()
+    with _config_lock:
+        if signature == _config_cache["signature"]:
+            return _config_cache["config"]
     
-    # features settings
-    if "features" not in config:
-        config["features"] = {}
-    config["features"]["unsafe_allow_html"] = settings["features_html"]
-    config["features"]["latex"] = settings["features_latex"]
-    config["features"]["edit_message"] = settings["features_edit_message"]
+    config = {}
+    if signature is not None:
+        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+            config = toml.load(f)
+    snapshot = _freeze(config)
     
-    # project settings
-    if "project" not in config:
-        config["project"] = {}
-    config["project"]["session_timeout"] = settings["project_session_timeout"]
+    with _config_lock:
+        _config_cache["signature"] = signature
+        _config_cache["config"] = snapshot
+        _config_cache["widgets"] = None
+    return snapshot
+
+def runtime_patch(config) -> Dict[str, Dict[str, Any]]:
+    """The values in a config.toml snapshot that apply_runtime_settings knows about"""
+    patch = {}
+    for section, key in RUNTIME_KEYS:
+        if key in config.get(section, {}):
+            patch.setdefault(section, {})[key] = config[section][key]
+    return patch
+
+def settings_to_patch(settings) -> Dict[str, Dict[str, Any]]:
+    """Convert settings widget values into a {section: {key: value}} config patch"""
+    patch = {}
+    for setting_id, (section, key) in SETTINGS_KEYS.items():
+        if setting_id in settings:
+            patch.setdefault(section, {})[key] = settings[setting_id]
+    return patch
+
+def write_config_atomically(patch: Dict[str, Dict[str, Any]]):
+    """Apply a patch to config.toml via temp file, fsync and atomic rename"""
+    config = _thaw(load_current_config())
+    for section, values in patch.items():
+        config.setdefault(section, {}).update(values)
     
-    # Save to file
-    config_path = ".chainlit/config.toml"
-    with open(config_path, 'w', encoding='utf-8') as f:
-        toml.dump(config, f)
+    write_atomically(CONFIG_PATH, toml.dumps(config), durable=True)
+
+class ConfigWriter:
+    """Single background task that serializes and coalesces config.toml writes
+
+    Patches submitted during a burst are merged and written once the burst
+    has been quiet for `debounce` seconds (or after `max_delay` at most).
+    Every submitter gets a future that resolves to True once its patch is
+    on disk, or False if the write failed (the error is logged).
+    """
+
+    def __init__(self, debounce: float = CONFIG_WRITE_DEBOUNCE, max_delay: float = CONFIG_WRITE_MAX_DELAY):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._waiters: List[asyncio.Future] = []
+        self._writing: List[asyncio.Future] = []
+        self._wakeup = None
+        self._task = None
+
+    def submit(self, patch: Dict[str, Dict[str, Any]]) -> asyncio.Future:
+        """Queue a patch without blocking; returns a future for the write"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+        
+        for section, values in patch.items():
+            self._pending.setdefault(section, {}).update(values)
+        future = loop.create_future()
+        self._waiters.append(future)
+        self._wakeup.set()
+        return future
+
+    @property
+    def pending(self) -> bool:
+        """Whether patches are queued or being written"""
+        return bool(self._waiters or self._writing)
+
+    async def flush(self):
+        """Wait until every submitted patch has been written"""
+        waiters = self._writing + self._waiters
+        if waiters:
+            await asyncio.gather(*waiters)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            
+            # Debounce: keep collecting until the burst goes quiet or max_delay passes
+            deadline = loop.time() + self.max_delay
+            while True:
+                self._wakeup.clear()
+                timeout = min(self.debounce, deadline - loop.time())
+                if timeout <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except TimeoutError:
+                    break
+            
+            patch, waiters = self._pending, self._waiters
+            self._pending, self._waiters, self._writing = {}, [], waiters
+            self._wakeup.clear()
+            started = loop.time()
+            try:
+                await asyncio.to_thread(write_config_atomically, patch)
+                written = True
+            except Exception:
+                logger.exception("Failed to write %s", CONFIG_PATH)
+                written = False
+            metrics.observe("config_write", (loop.time() - started) * 1000, error=not written)
+            self._writing = []
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(written)
+
+config_writer = ConfigWriter()
+
+class ConfigWatcher:
+    """Applies settings saved by other workers to this worker's runtime config
+
+    Every worker writes config.toml but only updates its own process, so
+    each one polls the file's stat signature and re-applies it when another
+    worker changed it. Checks are skipped while this worker has a write
+    queued, since the file does not hold its latest settings yet.
+    """
+
+    def __init__(self, interval: float = CONFIG_WATCH_INTERVAL):
+        self.interval = interval
+        self.signature = None
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self.signature = _config_signature()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def check(self) -> List[Tuple[str, str]]:
+        """Apply config.toml if it changed since the last check; returns what changed here"""
+        signature = await asyncio.to_thread(_config_signature)
+        if signature == self.signature or config_writer.pending:
+            return []
+        current = await asyncio.to_thread(load_current_config)
+        self.signature = signature
+        changed = apply_runtime_settings(runtime_patch(current))
+        if changed:
+            logger.info("Applied settings changed in %s: %s", CONFIG_PATH, ", ".join(f"{section}.{key}" for section, key in changed))
+            await notify_sessions(changed)
+        return changed
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.check()
+            except Exception:
+                logger.exception("Checking %s for changes failed", CONFIG_PATH)
+
+config_watcher = ConfigWatcher()
+
+@metrics.instrument()
+async def save_config_to_file(settings) -> asyncio.Future:
+    """Queue settings for saving to config.toml
+
+    Returns immediately with a future that resolves to True once the
+    (possibly coalesced) write has been committed to disk.
+    """
+    return config_writer.submit(settings_to_patch(settings))
 
 async def show_config_editor():
     """Display settings editor"""
     await create_config_settings()
     
     await cl.Message(
-        content="⚙️ **Chainlit Settings Editor**\n\nYou can change settings from the settings panel in the top right.\nApplication restart is required to apply changes."
+        content="⚙️ **Chainlit Settings Editor**\n\nYou can change settings from the settings panel in the top right.\nChanges apply without a restart; refresh the page to see appearance changes."
     ).send()
\ No newline at end of file
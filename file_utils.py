@@ -0,0 +1,64 @@
+import contextlib
+import hashlib
+import os
+import stat
+import tempfile
+from typing import Iterator, Union
+
+# Imported by the preview worker processes too: keep this module free of Chainlit imports.
+
+# Mode open() would give a new file; read once, as os.umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+NEW_FILE_MODE = 0o666 & ~_UMASK
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file, streamed so memory stays flat"""
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+@contextlib.contextmanager
+def atomic_path(path: str, durable: bool = False) -> Iterator[str]:
+    """Temp path next to `path` to write to; it replaces `path` if the block succeeds
+
+    Readers see the old file or the new one, never a partial write. The
+    file keeps the mode of the one it replaces, or gets the usual umask-based
+    mode if it is new (mkstemp creates 0600).
+    `durable` also fsyncs the file and the rename, for files that must
+    survive a power loss.
+    """
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}-", suffix=".tmp")
+    os.close(fd)
+    try:
+        yield temp_path
+        try:
+            os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+        except FileNotFoundError:
+            os.chmod(temp_path, NEW_FILE_MODE)
+        if durable:
+            with open(temp_path, "rb") as f:
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_path)
+        raise
+
+    if durable and hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+def write_atomically(path: str, data: Union[bytes, str], durable: bool = False):
+    """Replace `path` with `data` (str is written as UTF-8) through atomic_path"""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    with atomic_path(path, durable) as temp_path:
+        with open(temp_path, "wb") as f:
+            f.write(data)
@@ -0,0 +1,240 @@
+import asyncio
+import bisect
+import os
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from chainlit.config import config
+from starlette.responses import JSONResponse
+
+from server_routes import add_route
+from session_state import session_store
+
+VIEWER_PATH = "/viewer/{viewer_id}"
+VIEWER_PAGE_LINES = int(os.environ.get("VIEWER_PAGE_LINES", 200))
+VIEWER_PAGE_MAX_BYTES = int(os.environ.get("VIEWER_PAGE_MAX_BYTES", 64 * 1024))
+# Most viewers kept open on this worker; the least recently used are dropped and reopened from the session store on demand
+VIEWER_MAX_OPEN = int(os.environ.get("VIEWER_MAX_OPEN", 1000))
+INDEX_CHUNK_SIZE = 1024 * 1024
+
+
+class ViewerFile:
+    """An uploaded text file served page by page
+
+    A page ends after VIEWER_PAGE_LINES lines or VIEWER_PAGE_MAX_BYTES
+    bytes, whichever comes first, so even a file on a single line can be
+    paged through. `offsets` holds the byte offset and `line_starts` the
+    1-based line number at which every page starts, and `mid_line` marks
+    the pages that start inside a line; all are built once, on first use,
+    by a single streaming pass over the file. `encoding` is
+    the sniffed one and must be ASCII compatible, so lines can be found
+    by b"\n".
+    """
+
+    def __init__(self, path: str, name: str, session_id: str, size: int, lines: int, encoding: str = "utf-8"):
+        self.path = path
+        self.name = name
+        self.session_id = session_id
+        self.size = size
+        self.lines = lines
+        self.encoding = encoding
+        # An estimate until the index is built
+        self.pages = max(1, -(-lines // VIEWER_PAGE_LINES), -(-size // VIEWER_PAGE_MAX_BYTES))
+        self.offsets: Optional[array] = None
+        self.line_starts: Optional[array] = None
+        self.mid_line: Optional[array] = None
+        self._index_lock = threading.Lock()
+
+    def build_index(self) -> array:
+        """Scan the file once, recording where each page starts"""
+        with self._index_lock:
+            if self.offsets is not None:
+                return self.offsets
+            offsets = array("q", [0])
+            line_starts = array("q", [1])
+            mid_line = array("b", [0])
+            line = 1
+            page_start = page_lines = 0
+            position = 0
+            previous = b"\n"
+            with open(self.path, "rb") as f:
+                while chunk := f.read(INDEX_CHUNK_SIZE):
+                    start = 0
+                    while True:
+                        # Where the page reaches its byte limit, relative to this chunk
+                        limit = page_start + VIEWER_PAGE_MAX_BYTES - position
+                        index = chunk.find(b"\n", start, min(limit, len(chunk)))
+                        if index != -1:
+                            line += 1
+                            page_lines += 1
+                            start = index + 1
+                            if page_lines < VIEWER_PAGE_LINES:
+                                continue
+                        elif limit < len(chunk):
+                            # A long line: the page ends mid-line
+                            start = limit
+                        else:
+                            break
+                        page_start, page_lines = position + start, 0
+                        if page_start < self.size:
+                            offsets.append(page_start)
+                            line_starts.append(line)
+                            mid_line.append((chunk[start - 1:start] if start else previous) != b"\n")
+                    position += len(chunk)
+                    previous = chunk[-1:]
+            self.line_starts = line_starts
+            self.mid_line = mid_line
+            self.offsets = offsets
+            self.pages = len(offsets)
+            return offsets
+
+    def _complete_characters(self, data: bytes, start: int, end: int) -> bytes:
+        """Move page edges that fall inside a UTF-8 character to the character's end"""
+        if not self.encoding.startswith("utf-8"):
+            return data
+        skip = 0
+        while start > 0 and skip < 3 and skip < len(data) and data[skip] & 0xC0 == 0x80:
+            skip += 1
+        cut = end - start
+        while cut < len(data) and cut - (end - start) < 3 and data[cut] & 0xC0 == 0x80:
+            cut += 1
+        return data[skip:cut]
+
+    def read_page(self, page: int) -> Dict[str, Any]:
+        """Read one page (at most VIEWER_PAGE_LINES lines / VIEWER_PAGE_MAX_BYTES bytes)"""
+        offsets = self.offsets if page == 0 and self.offsets is None else self.build_index()
+        page = min(max(page, 0), self.pages - 1)
+        start = offsets[page] if offsets else 0
+        end = offsets[page + 1] if offsets and page + 1 < len(offsets) else self.size
+        end = min(end, start + VIEWER_PAGE_MAX_BYTES)
+
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            # A few bytes past the end, to finish a character the page boundary splits
+            data = f.read(end - start + 3)
+        if offsets is None:
+            # First page before the index exists: stop after the page's last line
+            cut = -1
+            for _ in range(VIEWER_PAGE_LINES):
+                cut = data.find(b"\n", cut + 1, end - start)
+                if cut == -1:
+                    break
+            if cut != -1:
+                end = start + cut + 1
+        text = self._complete_characters(data, start, end)
+        start_line = self.line_starts[page] if offsets else 1
+
+        return {
+            "page": page,
+            "pages": self.pages,
+            "start_line": start_line,
+            "end_line": start_line + text.count(b"\n", 0, len(text) - 1),
+            "start_offset": start,
+            "end_offset": end,
+            # The page ends inside a line longer than a page, which continues on the next one
+            "continues": end < self.size and data[end - start - 1:end - start] != b"\n",
+            "text": text.decode(self.encoding, errors="replace"),
+        }
+
+    def page_for_offset(self, offset: int) -> int:
+        """Page containing the given byte offset"""
+        return max(0, bisect.bisect_right(self.build_index(), offset) - 1)
+
+    def page_for_line(self, line: int) -> int:
+        """Page on which the given 1-based line starts"""
+        self.build_index()
+        page = bisect.bisect_left(self.line_starts, max(line, 1))
+        if page < len(self.line_starts) and self.line_starts[page] == line and not self.mid_line[page]:
+            return page
+        # The line starts inside the previous page
+        return max(0, page - 1)
+
+
+_viewers: "OrderedDict[str, ViewerFile]" = OrderedDict()
+
+
+def _remember(viewer_id: str, viewer: ViewerFile):
+    _viewers[viewer_id] = viewer
+    while len(_viewers) > VIEWER_MAX_OPEN:
+        _viewers.popitem(last=False)
+
+
+def open_viewer(path: str, name: str, session_id: str, size: int, lines: int, encoding: str = "utf-8") -> str:
+    """Register an uploaded file for paged viewing and return its viewer id
+
+    The registration is shared through the session store, so the id keeps
+    working on whichever worker the session reconnects to.
+    """
+    viewer_id = uuid.uuid4().hex
+    _remember(viewer_id, ViewerFile(path, name, session_id, size, lines, encoding))
+    session_store.put_handle(viewer_id, session_id, {
+        "kind": "viewer", "path": path, "name": name, "size": size, "lines": lines, "encoding": encoding,
+    })
+    return viewer_id
+
+
+def needs_viewer(size: int, lines: int) -> bool:
+    """Whether a text file is larger than a single page"""
+    return lines > VIEWER_PAGE_LINES or size > VIEWER_PAGE_MAX_BYTES
+
+
+async def open_viewer_props(path: str, name: str, session_id: str, size: int, lines: int, size_label: str, encoding: str = "utf-8") -> Dict[str, Any]:
+    """Open a viewer and return FileViewer element props holding only the first page"""
+    viewer_id = open_viewer(path, name, session_id, size, lines, encoding)
+    first_page = await asyncio.to_thread(_viewers[viewer_id].read_page, 0)
+    return {
+        "name": name,
+        "endpoint": viewer_url(viewer_id),
+        "size": size_label,
+        "lines": lines,
+        "pageLines": VIEWER_PAGE_LINES,
+        "firstPage": first_page,
+    }
+
+
+def viewer_url(viewer_id: str) -> str:
+    """URL the FileViewer element fetches pages from"""
+    return config.run.root_path + VIEWER_PATH.format(viewer_id=viewer_id)
+
+
+async def get_viewer(viewer_id: str) -> Optional[ViewerFile]:
+    viewer = _viewers.get(viewer_id)
+    if viewer is not None:
+        _viewers.move_to_end(viewer_id)
+        return viewer
+    # Opened on another worker, or dropped from this one's LRU
+    handle = await session_store.handle(viewer_id)
+    if handle is None or handle[1].get("kind") != "viewer":
+        return None
+    session_id, data = handle
+    viewer = ViewerFile(data["path"], data["name"], session_id, data["size"], data["lines"], data["encoding"])
+    _remember(viewer_id, viewer)
+    return viewer
+
+
+def close_session_viewers(session_id: str):
+    """Forget every viewer opened by a session, once its uploads are evicted"""
+    for viewer_id in [key for key, viewer in _viewers.items() if viewer.session_id == session_id]:
+        del _viewers[viewer_id]
+
+
+async def viewer_endpoint(viewer_id: str, page: int = 0, line: Optional[int] = None, offset: Optional[int] = None):
+    """Serve one page, selected by page number, 1-based line or byte offset"""
+    viewer = await get_viewer(viewer_id)
+    if viewer is None:
+        return JSONResponse({"detail": "Viewer not found"}, status_code=404)
+    try:
+        if line is not None:
+            page = await asyncio.to_thread(viewer.page_for_line, line)
+        if offset is not None:
+            page = await asyncio.to_thread(viewer.page_for_offset, offset)
+        result = await asyncio.to_thread(viewer.read_page, page)
+    except OSError:
+        return JSONResponse({"detail": "File no longer available"}, status_code=410)
+    return JSONResponse(result)
+
+
+add_route(VIEWER_PATH, viewer_endpoint, include_in_schema=False)
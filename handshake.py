@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+import json
+from typing import Dict, Any, List, Optional
+
+import chainlit as cl
+
+try:
+    from config_editor import get_config_widgets
+except ImportError:  # config_editor is optional
+    get_config_widgets = None
+
+# Slash commands offered in every chat
+COMMANDS = [
+    {"id": "components", "icon": "palette", "description": "Show custom components"},
+    {"id": "cards", "icon": "info", "description": "Display info cards"},
+    {"id": "demo", "icon": "rocket", "description": "Full feature demo"},
+    {"id": "settings", "icon": "settings", "description": "UI settings"},
+]
+
+
+class Handshake:
+    """What on_chat_start sends every session, prepared once per config
+
+    `version` hashes the commands and settings widgets, so a session that
+    already received this exact bundle can be told apart from one that needs it.
+    """
+
+    __slots__ = ("version", "commands", "widgets", "settings")
+
+    def __init__(self, commands: List[Dict[str, Any]], widgets) -> None:
+        self.commands = commands
+        self.widgets = [widget.to_dict() for widget in widgets]
+        # Initial values, what ChatSettings.send() would store on the session
+        self.settings = {widget.id: widget.initial for widget in widgets}
+        payload = json.dumps({"commands": commands, "widgets": self.widgets}, sort_keys=True, default=str)
+        self.version = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+# Rebuilt only when config_editor hands out a new widget tuple (the config file changed)
+_current: Dict[str, Any] = {"widgets": None, "handshake": None}
+counters = {"sent": 0, "skipped": 0}
+
+
+def current_handshake() -> Handshake:
+    widgets = get_config_widgets() if get_config_widgets else ()
+    if _current["handshake"] is None or _current["widgets"] is not widgets:
+        _current["handshake"] = Handshake(COMMANDS, widgets)
+        _current["widgets"] = widgets
+    return _current["handshake"]
+
+
+async def send_handshake(held_version: Optional[str] = None) -> str:
+    """Send commands and settings widgets unless the client already holds this version
+
+    Returns the current version, for the caller to record with the session.
+    """
+    handshake = current_handshake()
+    session = cl.context.session
+    if not session.chat_settings:
+        cl.context.emitter.set_chat_settings(dict(handshake.settings))
+    if held_version == handshake.version:
+        counters["skipped"] += 1
+        return handshake.version
+
+    emits = [cl.context.emitter.set_commands(handshake.commands)]
+    if handshake.widgets:
+        emits.append(cl.context.emitter.emit("chat_settings", handshake.widgets))
+    await asyncio.gather(*emits)
+    counters["sent"] += 1
+    return handshake.version
+
+
+def stats() -> Dict[str, float]:
+    return dict(counters)
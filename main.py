@@ -3,6 +3,25 @@ from typing import Dict, Any, List
 import asyncio
 import json
 
+import handshake
+import metrics
+import payloads
+from admission import admission, action_key
+from batching import send_batch
+from handshake import send_handshake
+from streaming import stream_message
+from mirror import mirror_url
+from file_viewer import needs_viewer, open_viewer_props, close_session_viewers
+from prompt_store import prompts_list_props
+from previews import PREVIEW_BUILDERS, close_session_previews, preview_stats, shutdown_previews, start_previews
+from session_memory import memory_accountant
+from session_state import session_store, record_sidebar, restore_session, send_sidebar
+from spool import upload_spool
+from static_assets import install_assets
+from translations import translation_catalog
+from upload_cache import upload_cache
+from upload_processing import process_uploads, format_text_preview, format_size
+
 # Landing page HTML with modern design
 landing_page_html = """
 <div class="wrapper">
@@ -93,12 +112,15 @@ landing_page_html = """
 </style>
 """
 
+# Profile icons are served from the local mirror, downscaled for the profile picker
+PROFILE_ICON_SIZE = 64
+
 # Chat profile configuration
 chat_profiles = [
     cl.ChatProfile(
         name="UI Demo",
         markdown_description=landing_page_html,
-        icon="https://img.icons8.com/?size=100&id=eoxMN35Z6JKg&format=png&color=000000",
+        icon=mirror_url("https://img.icons8.com/?size=100&id=eoxMN35Z6JKg&format=png&color=000000", size=PROFILE_ICON_SIZE),
         default=True,
         starters=[
             cl.Starter(
@@ -122,7 +144,7 @@ chat_profiles = [
     cl.ChatProfile(
         name="Interactive Chat",
         markdown_description="Experience interactive features with action buttons and follow-up messages.\n\n*Demonstrates dynamic conversation flows and UI responses.*",
-        icon="https://img.icons8.com/?size=100&id=BpLxiRbSRN80&format=png",
+        icon=mirror_url("https://img.icons8.com/?size=100&id=BpLxiRbSRN80&format=png", size=PROFILE_ICON_SIZE),
         starters=[
             cl.Starter(
                 label="Interactive Demo",
@@ -137,7 +159,7 @@ chat_profiles = [
     cl.ChatProfile(
         name="File Processing",
         markdown_description="File upload and processing demonstration with sidebar display.\n\nUpload files to see dynamic content rendering in the sidebar.",
-        icon="https://img.icons8.com/?size=100&id=85784&format=png",
+        icon=mirror_url("https://img.icons8.com/?size=100&id=85784&format=png", size=PROFILE_ICON_SIZE),
         starters=[
             cl.Starter(
                 label="File Features",
@@ -157,123 +179,144 @@ async def chat_profile():
 
 @cl.on_chat_start
 async def start():
-    # Initialize settings from config_editor if available
+    # A reconnect served by another worker gets its profile and settings back
+    snapshot = await restore_session()
+    held_version = snapshot.get("handshake") if snapshot else None
+    
+    # Commands and settings widgets, skipped if this client already holds the current version
+    version = await send_handshake(held_version)
+    
+    # Initialize the sidebar (empty, or as the session left it) unless the client still shows it
+    if held_version != version:
+        await send_sidebar(snapshot)
+    session_store.update(cl.context.session.id, handshake=version)
+
+@cl.on_chat_end
+async def end():
+    # Uploads (with their viewers and previews) and admission limits outlive a disconnect; they go after the session timeout
+    upload_spool.end_session(cl.context.session.id)
+    # Chainlit ends the chat on every disconnect; keep the snapshot for a reconnect
+    session_store.touch(cl.context.session.id)
+
+@cl.on_app_startup
+async def startup():
+    # Background accounting and eviction of uploaded files
+    upload_spool.start()
+    start_previews()
+    session_store.start()
+    memory_accountant.start()
+    
+    # Settings saved on another worker reach this one through config.toml
     try:
-        from config_editor import create_config_settings
-        await create_config_settings()
+        from config_editor import config_watcher
+        config_watcher.start()
     except ImportError:
         pass  # config_editor is optional
+
+@cl.on_app_shutdown
+async def shutdown():
+    upload_spool.stop()
+    memory_accountant.stop()
+    shutdown_previews()
+    await session_store.stop()
     
-    # Command configuration
-    commands = [
-        {"id": "components", "icon": "palette", "description": "Show custom components"},
-        {"id": "cards", "icon": "info", "description": "Display info cards"},
-        {"id": "demo", "icon": "rocket", "description": "Full feature demo"},
-        {"id": "settings", "icon": "settings", "description": "UI settings"},
-    ]
-    
-    await cl.context.emitter.set_commands(commands)
-    
-    # Initialize empty sidebar
-    await cl.ElementSidebar.set_elements([])
+    # Make sure queued settings updates reach disk
+    try:
+        from config_editor import config_watcher, config_writer
+        config_watcher.stop()
+        await config_writer.flush()
+    except ImportError:
+        pass  # config_editor is optional
 
 @cl.on_message
+@admission.guard()
 async def main(message: cl.Message):
     chat_profile = cl.user_session.get("chat_profile")
     
-    if chat_profile == "UI Demo":
-        await handle_ui_demo(message)
-    elif chat_profile == "Interactive Chat":
-        await handle_interactive_chat(message)
-    elif chat_profile == "File Processing":
-        await handle_file_processing(message)
+    # Commands and trigger messages first, then the profile's default handler
+    handler = route_message(chat_profile, message)
+    if handler:
+        await handler()
+        return
+    
+    handler = PROFILE_HANDLERS.get(chat_profile)
+    if handler:
+        await handler(message)
     else:
         await cl.Message(content="Please select a chat profile.").send()
 
-async def handle_ui_demo(message: cl.Message):
-    # Process commands with highest priority
+def route_message(chat_profile: str, message: cl.Message):
+    """Look up the handler for a slash command or trigger message, if any"""
     if message.command:
-        command = message.command
-        if command == "components":
-            await show_custom_components()
-            return
-        elif command == "cards":
-            await show_info_cards()
-            return
-        elif command == "demo":
-            await show_feature_demo()
-            return
-        elif command == "settings":
-            await show_ui_settings()
-            return
-    
-    # Handle special content messages
-    if message.content == "🎨":
-        await show_custom_components()
-        return
-    elif message.content in ["📋", "info"]:
-        await show_info_cards()
-        return
-    elif message.content.lower() in ["demo", "features"]:
-        await show_feature_demo()
-        return
-    elif message.content == "⚙️":
-        await show_ui_settings()
-        return
-    
+        handler = COMMAND_ROUTES.get((chat_profile, message.command))
+        if handler:
+            return handler
+    content = message.content or ""
+    return TRIGGER_ROUTES.get((chat_profile, content)) or TRIGGER_ROUTES_NOCASE.get((chat_profile, content.lower()))
+
+@metrics.instrument()
+async def handle_ui_demo(message: cl.Message):
     # Default response with action buttons
     response = f"**UI Demo Assistant**\n\nProcessing: {message.content}\n\nExplore the available UI features using the action buttons below."
     
     # Main action buttons
-    actions = [
-        cl.Action(name="action_summary", label="📝 Create Summary", payload={"action": "summary"}),
-        cl.Action(name="action_detail", label="🔍 Show Details", payload={"action": "detail"}),
-        cl.Action(name="action_components", label="🎨 Custom Components", payload={"action": "components"}),
-        cl.Action(name="action_cards", label="📋 Info Cards", payload={"action": "cards"}),
-        cl.Action(name="action_demo", label="⭐ Full Demo", payload={"action": "demo"}),
-        cl.Action(name="action_settings", label="⚙️ UI Settings", payload={"action": "settings"}),
-    ]
+    actions = payloads.actions("ui_demo")
     
-    await cl.Message(content=response, actions=actions).send()
+    await stream_message(response, actions=actions)
 
+@metrics.instrument()
 async def handle_interactive_chat(message: cl.Message):
     response = f"**Interactive Chat Mode**\n\nYour message: {message.content}\n\nThis mode demonstrates dynamic conversation flows with contextual action buttons."
     
     # Interactive actions
-    actions = [
-        cl.Action(name="action_analyze", label="� Deep Analysis", payload={"action": "analyze"}),
-        cl.Action(name="action_expand", label="📈 Expand Topic", payload={"action": "expand"}),
-        cl.Action(name="action_related", label="🔗 Related Topics", payload={"action": "related"}),
-    ]
+    actions = payloads.actions("interactive_chat")
     
-    await cl.Message(content=response, actions=actions).send()
+    await stream_message(response, actions=actions)
 
+@metrics.instrument()
 async def handle_file_processing(message: cl.Message):
     files = message.elements or []
     
     if files:
-        # Process uploaded files
-        sidebar_elements = []
+        # Process uploaded files concurrently, off the event loop
+        results = await process_uploads(files)
+        
+        # Files larger than one page go to the paged viewer, which only ships the first page
+        for result in results:
+            preview = result.get("preview")
+            if result["kind"] == "text" and needs_viewer(preview["size"], preview["lines"]):
+                result["kind"] = "viewer"
+                result["viewer"] = await open_viewer_props(
+                    result["path"], result["name"], cl.context.session.id,
+                    preview["size"], preview["lines"], format_size(preview["size"]), result["encoding"],
+                )
+        
+        # Images and PDFs are rendered in the preview worker pool; originals are only fetched on demand
+        rendered = [result for result in results if result["kind"] in PREVIEW_BUILDERS]
+        previews = await asyncio.gather(*(
+            PREVIEW_BUILDERS[result["kind"]](result["path"], result["name"], result["mime"], cl.context.session.id)
+            for result in rendered
+        ))
+        for result, props in zip(rendered, previews):
+            if props:
+                result["rendered"] = props
+                result["cached"] = result["cached"] or props["cached"]
+        
+        sidebar_elements = [build_sidebar_element(result) for result in results]
         for file in files:
-            if file.mime and file.mime.startswith('image/'):
-                sidebar_elements.append(cl.Image(name=file.name, path=file.path))
-            elif file.mime == 'application/pdf':
-                sidebar_elements.append(cl.Pdf(name=file.name, path=file.path))
-            elif file.mime and (file.mime.startswith('text/') or 'json' in file.mime):
-                try:
-                    with open(file.path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    sidebar_elements.append(cl.Text(name=file.name, content=content))
-                except:
-                    sidebar_elements.append(cl.File(name=file.name, path=file.path))
-            else:
-                sidebar_elements.append(cl.File(name=file.name, path=file.path))
+            metrics.record_upload(metrics.element_size(file))
+        metrics.record_elements(sidebar_elements)
+        file_list = [format_upload_line(result) for result in results]
         
         # Display files in sidebar
         await cl.ElementSidebar.set_elements(sidebar_elements)
         await cl.ElementSidebar.set_title("Uploaded Files")
+        await record_sidebar("Uploaded Files", sidebar_elements)
+        await memory_accountant.enforce(cl.context.session.id)
+        
+        # Sidebar elements are copies in the session's spool directory
+        await upload_spool.measure(cl.context.session.id)
         
-        file_list = [f"- {file.name}" for file in files]
         response = f"**File Processing Complete**\n\nProcessed {len(files)} file(s):\n" + "\n".join(file_list) + f"\n\nMessage: {message.content}\n\nFiles are displayed in the sidebar for reference."
         
     else:
@@ -281,121 +324,39 @@ async def handle_file_processing(message: cl.Message):
     
     await cl.Message(content=response).send()
 
-async def show_custom_components():
-    """Display custom React components"""
-    # Sample custom prompts data
-    prompts_data = [
-        {
-            "id": "1",
-            "title": "Summarize Content",
-            "prompt": "Please provide a concise summary focusing on the main points and key insights.",
-            "icon": "📝",
-            "category": "Analysis"
-        },
-        {
-            "id": "2", 
-            "title": "Technical Explanation",
-            "prompt": "Explain this technical concept in simple terms with practical examples.",
-            "icon": "🔧",
-            "category": "Technical"
-        },
-        {
-            "id": "3",
-            "title": "Creative Ideas",
-            "prompt": "Generate 3 innovative ideas with feasibility analysis for each.",
-            "icon": "💡",
-            "category": "Creative"
-        },
-        {
-            "id": "4",
-            "title": "Problem Solving",
-            "prompt": "Break down this problem into manageable steps with prioritized solutions.",
-            "icon": "🔍",
-            "category": "Analysis" 
-        },
-        {
-            "id": "5",
-            "title": "Code Review",
-            "prompt": "Review this code for improvements in performance, readability, and best practices.",
-            "icon": "💻",
-            "category": "Technical"
-        },
-        {
-            "id": "6",
-            "title": "Business Strategy",
-            "prompt": "Develop a strategic business approach with clear objectives and measurable outcomes.",
-            "icon": "📊",
-            "category": "Business"
-        }
-    ]
-    
-    await cl.Message(
-        content="🎨 **Custom React Components**\n\nInteractive prompt management system with editable functionality:",
-        elements=[
-            cl.CustomElement(
-                name="CustomPromptsList",
-                props={
-                    "data": prompts_data,
-                    "editable": True
-                }
-            )
-        ]
-    ).send()
-
-async def show_info_cards():
-    """Display information cards with structured data"""
-    info_data = {
-        "title": "Chainlit UI Customization Techniques",
-        "description": "Advanced UI/UX patterns for modern web applications",
-        "image_url": "https://images.unsplash.com/photo-1555066931-4365d14bab8c?w=400&h=200&fit=crop",
-        "category": "UI/UX Demo",
-        "features": [
-            {"icon": "🎨", "text": "Glassmorphism Effects"},
-            {"icon": "⚡", "text": "Smooth Animations"},
-            {"icon": "📱", "text": "Responsive Design"},
-            {"icon": "🌙", "text": "Dark Mode Support"},
-            {"icon": "💾", "text": "Local Storage"},
-            {"icon": "🔧", "text": "Custom Components"}
-        ],
-        "items": [
-            {
-                "title": "Custom Component System",
-                "description": "React-based custom elements with local storage integration for persistent user preferences."
-            },
-            {
-                "title": "Dynamic Info Cards",
-                "description": "Flexible card components supporting various content types, images, and interactive features."
-            },
-            {
-                "title": "Modern CSS Techniques",
-                "description": "Implementation of cutting-edge CSS features including glassmorphism, gradients, and hover effects."
-            }
-        ]
-    }
-    
-    await cl.Message(
-        content="📋 **Interactive Info Cards**\n\nShowcasing structured data presentation:",
-        elements=[
-            cl.CustomElement(
-                name="InfoCards",
-                props={"data": info_data}
-            )
-        ]
-    ).send()
-
-async def show_feature_demo():
-    """Comprehensive feature demonstration"""
-    await cl.Message(
-        content="🚀 **Complete Feature Demonstration**\n\nExploring all customization capabilities:"
-    ).send()
-    
-    # Show all features in sequence
-    await show_custom_components()
-    await asyncio.sleep(1)
-    await show_info_cards()
-    
-    # Feature summary
-    features_text = """
+def build_sidebar_element(result: Dict[str, Any]):
+    """Create the sidebar element for a processed upload"""
+    if result["kind"] == "image":
+        if "rendered" in result:
+            return cl.CustomElement(name="ImagePreview", props=result["rendered"])
+        return cl.Image(name=result["name"], path=result["path"])
+    elif result["kind"] == "pdf":
+        if "rendered" in result:
+            return cl.CustomElement(name="PdfPreview", props=result["rendered"])
+        return cl.Pdf(name=result["name"], path=result["path"])
+    elif result["kind"] == "text":
+        return cl.Text(name=result["name"], content=format_text_preview(result["preview"]))
+    elif result["kind"] == "viewer":
+        return cl.CustomElement(name="FileViewer", props=result["viewer"])
+    return cl.File(name=result["name"], path=result["path"])
+
+def format_upload_line(result: Dict[str, Any]) -> str:
+    """Summary line for a processed upload"""
+    details = []
+    if result["kind"] in ("text", "viewer"):
+        preview = result["preview"]
+        details += [format_size(preview["size"]), f"{preview['lines']:,} lines"]
+    elif result["kind"] == "pdf" and "rendered" in result:
+        details.append(f"{result['rendered']['pages']:,} pages")
+    if result.get("sniffed"):
+        details.append(f"detected as {result['mime']}")
+    details.append(f"{result['work_ms']:.0f} ms" + (", cached" if result["cached"] else ""))
+    return f"- {result['name']} ({', '.join(details)})"
+
+# Delay before the info cards fade in during the feature demo (applied in the browser)
+FEATURE_DEMO_REVEAL_MS = 1000
+
+FEATURE_SUMMARY = """
 **🎯 Key Features Demonstrated:**
 
 • **Custom React Components**: Interactive elements with real-time state management
@@ -413,9 +374,48 @@ async def show_feature_demo():
 - Dynamic sidebar content management
 - Interactive command system
 """
-    
-    await cl.Message(content=features_text).send()
 
+async def build_custom_components() -> cl.Message:
+    # Only the first page of the shared library; the element fetches the rest on demand
+    elements = [cl.CustomElement(name="CustomPromptsList", props=await prompts_list_props())]
+    return cl.Message(
+        content="🎨 **Custom React Components**\n\nInteractive prompt management system with editable functionality:",
+        elements=elements
+    )
+
+def build_info_cards(reveal_delay_ms: int = 0) -> cl.Message:
+    # A reveal delay is applied by the element in the browser, not by holding the handler
+    if reveal_delay_ms:
+        elements = [payloads.custom_element("InfoCards", revealDelayMs=reveal_delay_ms)]
+    else:
+        elements = [payloads.custom_element("InfoCards")]
+    return cl.Message(
+        content="📋 **Interactive Info Cards**\n\nShowcasing structured data presentation:",
+        elements=elements
+    )
+
+@metrics.instrument()
+async def show_custom_components():
+    """Display custom React components"""
+    await send_batch(build_custom_components())
+
+@metrics.instrument()
+async def show_info_cards():
+    """Display information cards with structured data"""
+    await send_batch(build_info_cards())
+
+@metrics.instrument()
+async def show_feature_demo():
+    """Comprehensive feature demonstration"""
+    # Parts are prepared concurrently and sent as one ordered batch, then the summary streams in
+    await send_batch(
+        cl.Message(content="🚀 **Complete Feature Demonstration**\n\nExploring all customization capabilities:"),
+        build_custom_components(),
+        build_info_cards(reveal_delay_ms=FEATURE_DEMO_REVEAL_MS),
+    )
+    await stream_message(FEATURE_SUMMARY)
+
+@metrics.instrument()
 async def show_ui_settings():
     """Display UI configuration options"""
     try:
@@ -426,10 +426,8 @@ async def show_ui_settings():
             content="⚙️ **UI Settings**\n\nConfiguration options would appear here.\n\n*Note: Config editor is optional and not included in this simplified demo.*"
         ).send()
 
-# Action callback handlers
-@cl.action_callback("action_summary")
-async def on_action_summary(action):
-    content = """📝 **Summary Generation**
+# Action callback handlers (registered from ACTION_HANDLERS below)
+SUMMARY_CONTENT = """📝 **Summary Generation**
 
 Creating a comprehensive summary with structured analysis:
 
@@ -440,15 +438,13 @@ Creating a comprehensive summary with structured analysis:
 
 The summary will be organized for maximum clarity and usefulness."""
 
-    follow_up_actions = [
-        cl.Action(name="action_deep_analysis", label="🔬 Deep Analysis", payload={"action": "deep_analysis"}),
-        cl.Action(name="action_questions", label="❓ Related Questions", payload={"action": "questions"}),
-        cl.Action(name="action_export", label="📄 Export Summary", payload={"action": "export"})
-    ]
+async def on_action_summary(action):
+    content = SUMMARY_CONTENT
+    
+    follow_up_actions = payloads.actions("summary_follow_up")
     
-    await cl.Message(content=content, actions=follow_up_actions).send()
+    await stream_message(content, actions=follow_up_actions)
 
-@cl.action_callback("action_detail") 
 async def on_action_detail(action):
     content = """🔍 **Detailed Analysis**
 
@@ -464,15 +460,10 @@ Providing comprehensive explanation from multiple perspectives:
 • Cost-benefit analysis
 • Best practices and recommendations"""
 
-    follow_up_actions = [
-        cl.Action(name="action_implementation", label="⚙️ Implementation Guide", payload={"action": "implementation"}),
-        cl.Action(name="action_examples", label="💡 Examples", payload={"action": "examples"}),
-        cl.Action(name="action_best_practices", label="🎯 Best Practices", payload={"action": "best_practices"})
-    ]
+    follow_up_actions = payloads.actions("detail_follow_up")
     
-    await cl.Message(content=content, actions=follow_up_actions).send()
+    await stream_message(content, actions=follow_up_actions)
 
-@cl.action_callback("action_components")
 async def on_action_components(action):
     await show_custom_components()
     
@@ -483,9 +474,8 @@ async def on_action_components(action):
 • **Category Organization**: Efficient management by topic area
 • **Local Storage**: Persistent customizations across sessions"""
 
-    await cl.Message(content=guidance_content).send()
+    await stream_message(guidance_content)
 
-@cl.action_callback("action_cards")
 async def on_action_cards(action):
     await show_info_cards()
     
@@ -498,26 +488,21 @@ Built with modern web technologies:
 • **Glassmorphism**: Modern visual effects
 • **Image Integration**: Dynamic content loading"""
 
-    await cl.Message(content=tech_content).send()
+    await stream_message(tech_content)
 
-@cl.action_callback("action_demo") 
 async def on_action_demo(action):
     await show_feature_demo()
 
-@cl.action_callback("action_settings")
 async def on_action_settings(action):
     await show_ui_settings()
 
 # Additional action handlers for follow-up interactions
-@cl.action_callback("action_analyze")
 async def on_action_analyze(action):
-    await cl.Message(content="🔬 **Deep Analysis Mode**\n\nPerforming comprehensive analysis with data correlation and trend identification...").send()
+    await stream_message("🔬 **Deep Analysis Mode**\n\nPerforming comprehensive analysis with data correlation and trend identification...")
 
-@cl.action_callback("action_expand")
 async def on_action_expand(action):
-    await cl.Message(content="📈 **Topic Expansion**\n\nExploring related concepts and broader implications...").send()
+    await stream_message("📈 **Topic Expansion**\n\nExploring related concepts and broader implications...")
 
-@cl.action_callback("action_related")
 async def on_action_related(action):
     content = """🔗 **Related Topics**
 
@@ -528,9 +513,8 @@ Explore these connected concepts:
 • **CSS Advanced Techniques**: Contemporary styling approaches
 • **Interactive Web Applications**: User engagement strategies"""
     
-    await cl.Message(content=content).send()
+    await stream_message(content)
 
-@cl.action_callback("action_implementation")
 async def on_action_implementation(action):
     content = """⚙️ **Implementation Guide**
 
@@ -546,7 +530,118 @@ async def on_action_implementation(action):
 - Interactive features and animations
 - Testing and optimization"""
     
-    await cl.Message(content=content).send()
+    await stream_message(content)
+
+async def on_action_questions(action):
+    content = """❓ **Related Questions**
+
+Questions worth exploring next:
+
+• What are the most important takeaways for your use case?
+• Which assumptions would change the conclusions?
+• How does this compare with alternative approaches?
+• What would a first practical step look like?"""
+    
+    await stream_message(content)
+
+async def on_action_export(action):
+    elements = [cl.File(name="summary.md", content=SUMMARY_CONTENT, mime="text/markdown", display="inline")]
+    metrics.record_elements(elements)
+    
+    await cl.Message(
+        content="📄 **Export Summary**\n\nYour summary is ready to download:",
+        elements=elements
+    ).send()
+
+async def on_action_examples(action):
+    content = """💡 **Examples**
+
+• **Custom Prompts List**: React element with editable, categorized prompts
+• **Info Cards**: Structured data rendered from a single props object
+• **File Sidebar**: Uploads rendered as images, PDFs or text previews
+• **Follow-up Actions**: Buttons that chain into deeper explanations"""
+    
+    await stream_message(content)
+
+async def on_action_best_practices(action):
+    content = """🎯 **Best Practices**
+
+• **Keep handlers small**: One handler per action or command
+• **Reuse static payloads**: Build props and action sets once
+• **Stay responsive**: Move blocking work off the event loop
+• **Theme with variables**: Use CSS custom properties for light/dark modes"""
+    
+    await stream_message(content)
+
+# Routing tables: plain dict lookups, so dispatch cost doesn't grow with the number of routes
+PROFILE_HANDLERS = {
+    "UI Demo": handle_ui_demo,
+    "Interactive Chat": handle_interactive_chat,
+    "File Processing": handle_file_processing,
+}
+
+# (chat profile, slash command) -> handler
+COMMAND_ROUTES = {
+    ("UI Demo", "components"): show_custom_components,
+    ("UI Demo", "cards"): show_info_cards,
+    ("UI Demo", "demo"): show_feature_demo,
+    ("UI Demo", "settings"): show_ui_settings,
+}
+
+# (chat profile, message content) -> handler; the NOCASE table is matched on lowercased content
+TRIGGER_ROUTES = {
+    ("UI Demo", "🎨"): show_custom_components,
+    ("UI Demo", "📋"): show_info_cards,
+    ("UI Demo", "info"): show_info_cards,
+    ("UI Demo", "⚙️"): show_ui_settings,
+}
+TRIGGER_ROUTES_NOCASE = {
+    ("UI Demo", "demo"): show_feature_demo,
+    ("UI Demo", "features"): show_feature_demo,
+}
+
+# Action name -> callback, for every action any handler can emit
+ACTION_HANDLERS = {
+    "action_summary": on_action_summary,
+    "action_detail": on_action_detail,
+    "action_components": on_action_components,
+    "action_cards": on_action_cards,
+    "action_demo": on_action_demo,
+    "action_settings": on_action_settings,
+    "action_analyze": on_action_analyze,
+    "action_expand": on_action_expand,
+    "action_related": on_action_related,
+    "action_implementation": on_action_implementation,
+    "action_deep_analysis": on_action_analyze,
+    "action_questions": on_action_questions,
+    "action_export": on_action_export,
+    "action_examples": on_action_examples,
+    "action_best_practices": on_action_best_practices,
+}
+
+def register_action_callbacks():
+    """Register all action callbacks, failing fast if an emitted action has no handler"""
+    missing = payloads.action_names() - ACTION_HANDLERS.keys()
+    if missing:
+        raise RuntimeError(f"Actions without a handler: {', '.join(sorted(missing))}")
+    for name, handler in ACTION_HANDLERS.items():
+        # Repeated clicks on an action still being handled are dropped
+        cl.action_callback(name)(admission.guard(action_key)(metrics.instrument(name)(handler)))
+
+register_action_callbacks()
+install_assets()
+upload_spool.on_evict(close_session_viewers)
+upload_spool.on_evict(close_session_previews)
+upload_spool.on_evict(admission.forget)
+
+metrics.register_gauges("chainlit_upload_cache", "Processed-upload cache counters and usage", upload_cache.stats)
+metrics.register_gauges("chainlit_upload_spool", "Disk used by uploaded files, quotas and evictions", upload_spool.stats)
+metrics.register_gauges("chainlit_previews", "Disk used by derived previews, its budget and evictions", preview_stats)
+metrics.register_gauges("chainlit_admission", "Message and action admission: running, queued, deferred and rejected work", admission.stats)
+metrics.register_gauges("chainlit_translations", "Compiled translation bundles held in memory", translation_catalog.stats)
+metrics.register_gauges("chainlit_session_state", "Session snapshot cache and write-behind counters", session_store.stats)
+metrics.register_gauges("chainlit_handshake", "Chat start handshakes sent in full or skipped", handshake.stats)
+metrics.register_gauges("chainlit_session_memory", "Memory retained per session, by kind, and sidebar text spilled to disk", memory_accountant.stats)
 
 if __name__ == "__main__":
     print("Chainlit UI Customization Demo")
@@ -0,0 +1,234 @@
+import bisect
+import functools
+import hmac
+import os
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Any, Iterable, List, Tuple
+
+import chainlit as cl
+from chainlit.auth import decode_jwt, require_login, reuseable_oauth
+from fastapi import Request
+from starlette.responses import PlainTextResponse
+
+from server_routes import add_route
+
+METRICS_PATH = os.environ.get("METRICS_PATH", "/metrics")
+# Bearer token scrapers present; without it only signed-in users can read metrics, and nobody if login is off
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+# Histogram buckets for handler latency, in milliseconds
+LATENCY_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Histogram buckets for socket frames per streamed message
+FRAME_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Handler and chat profile of the running instrumented call, used to label byte counters
+_current: ContextVar[Tuple[str, str]] = ContextVar("metrics_handler", default=("none", "none"))
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus style"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# (handler, profile) -> histogram / counters
+_latency: Dict[Tuple[str, str], Histogram] = {}
+_stream_ttft: Dict[Tuple[str, str], Histogram] = {}
+_stream_frames: Dict[Tuple[str, str], Histogram] = {}
+_counters: Dict[str, Dict[Tuple[str, str], float]] = {
+    "calls": {},
+    "errors": {},
+    "element_bytes": {},
+    "upload_bytes": {},
+    "uploads": {},
+    "stream_tokens": {},
+    "stream_held_frames": {},
+}
+_counter_help = {
+    "calls": "Handler invocations",
+    "errors": "Handler invocations that raised",
+    "element_bytes": "Bytes of element content sent to clients",
+    "upload_bytes": "Bytes of uploaded files processed",
+    "uploads": "Uploaded files processed",
+    "stream_tokens": "Tokens streamed to clients",
+    "stream_held_frames": "Stream frames delayed because the client's socket was backed up",
+}
+
+# name -> (help, callable returning {stat: value})
+_gauges: Dict[str, Tuple[str, Callable[[], Dict[str, float]]]] = {}
+
+
+def _inc(counter: str, labels: Tuple[str, str], amount: float = 1):
+    values = _counters[counter]
+    values[labels] = values.get(labels, 0) + amount
+
+
+def _observe(histograms: Dict[Tuple[str, str], Histogram], labels: Tuple[str, str], value: float, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+    histogram = histograms.get(labels)
+    if histogram is None:
+        histogram = histograms[labels] = Histogram(buckets)
+    histogram.observe(value)
+
+
+def observe(handler: str, elapsed_ms: float, profile: str = "none", error: bool = False):
+    """Record one handler call"""
+    labels = (handler, profile)
+    _observe(_latency, labels, elapsed_ms)
+    _inc("calls", labels)
+    if error:
+        _inc("errors", labels)
+
+
+def instrument(name: str = None):
+    """Decorator recording latency, calls and errors of an async handler"""
+
+    def decorator(func):
+        handler = name or func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            profile = cl.user_session.get("chat_profile") or "none"
+            token = _current.set((handler, profile))
+            started = time.perf_counter()
+            error = False
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                observe(handler, (time.perf_counter() - started) * 1000, profile, error)
+                _current.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+def element_size(element: Any) -> int:
+    """Bytes a client has to fetch for an element"""
+    content = getattr(element, "content", None)
+    if isinstance(content, str):
+        return len(content.encode("utf-8"))
+    if isinstance(content, (bytes, bytearray)):
+        return len(content)
+    path = getattr(element, "path", None)
+    if path:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    return 0
+
+
+def record_elements(elements: Iterable[Any]):
+    """Count element bytes against the running handler"""
+    _inc("element_bytes", _current.get(), sum(element_size(element) for element in elements))
+
+
+def record_upload(size: int):
+    """Count one processed upload against the running handler"""
+    labels = _current.get()
+    _inc("uploads", labels)
+    _inc("upload_bytes", labels, size)
+
+
+def record_stream(ttft_ms: float, frames: int, tokens: int, held_frames: int):
+    """Record one streamed message against the running handler"""
+    labels = _current.get()
+    _observe(_stream_ttft, labels, ttft_ms)
+    _observe(_stream_frames, labels, frames, FRAME_BUCKETS)
+    _inc("stream_tokens", labels, tokens)
+    _inc("stream_held_frames", labels, held_frames)
+
+
+def register_gauges(name: str, help_text: str, collect: Callable[[], Dict[str, float]]):
+    """Export the stats returned by `collect` as `<name>{stat="..."}` gauges"""
+    _gauges[name] = (help_text, collect)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(handler: str, profile: str, extra: str = "") -> str:
+    return f'handler="{_escape(handler)}",profile="{_escape(profile)}"{extra}'
+
+
+def _render_histograms(lines: List[str], metric: str, help_text: str, histograms: Dict[Tuple[str, str], Histogram]):
+    lines.append(f"# HELP {metric} {help_text}")
+    lines.append(f"# TYPE {metric} histogram")
+    for (handler, profile), histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+            cumulative += count
+            le = f',le="{bound}"'
+            lines.append(f"{metric}_bucket{{{_labels(handler, profile, le)}}} {cumulative}")
+        lines.append(f"{metric}_sum{{{_labels(handler, profile)}}} {histogram.sum:.3f}")
+        lines.append(f"{metric}_count{{{_labels(handler, profile)}}} {histogram.count}")
+
+
+def render() -> str:
+    """Prometheus text exposition of all metrics"""
+    lines: List[str] = []
+    _render_histograms(lines, "chainlit_handler_latency_ms", "Handler latency in milliseconds", _latency)
+    _render_histograms(lines, "chainlit_stream_ttft_ms", "Time from stream start to the first token sent, in milliseconds", _stream_ttft)
+    _render_histograms(lines, "chainlit_stream_frames", "Socket frames per streamed message", _stream_frames)
+
+    for counter, values in _counters.items():
+        metric = f"chainlit_handler_{counter}_total"
+        lines.append(f"# HELP {metric} {_counter_help[counter]}")
+        lines.append(f"# TYPE {metric} counter")
+        for (handler, profile), value in sorted(values.items()):
+            lines.append(f"{metric}{{{_labels(handler, profile)}}} {value}")
+
+    for name, (help_text, collect) in sorted(_gauges.items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for stat, value in sorted(collect().items()):
+            lines.append(f'{name}{{stat="{_escape(stat)}"}} {value}')
+
+    return "\n".join(lines) + "\n"
+
+
+async def authorized(request: Request) -> bool:
+    """Whether a request may read metrics: it carries METRICS_TOKEN, or a signed-in user's token"""
+    if METRICS_TOKEN:
+        expected = f"Bearer {METRICS_TOKEN}".encode("utf-8")
+        if hmac.compare_digest(request.headers.get("authorization", "").encode("utf-8"), expected):
+            return True
+    if not require_login():
+        return False
+    token = await reuseable_oauth(request)
+    if not token:
+        return False
+    try:
+        decode_jwt(token)
+    except Exception:
+        return False
+    return True
+
+
+def unauthorized() -> PlainTextResponse:
+    return PlainTextResponse("Unauthorized", status_code=401, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def metrics_endpoint(request: Request):
+    if not await authorized(request):
+        return unauthorized()
+    return PlainTextResponse(render(), media_type="text/plain; version=0.0.4")
+
+
+add_route(METRICS_PATH, metrics_endpoint, include_in_schema=False)
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, Any, Optional
+
+import httpx
+from chainlit.config import APP_ROOT, config
+from fastapi import HTTPException, Request
+from starlette.responses import FileResponse, RedirectResponse, Response
+
+from file_utils import write_atomically
+from previews import PREVIEWS_AVAILABLE
+from server_routes import add_route
+from sniffing import match_magic
+
+logger = logging.getLogger(__name__)
+
+# Content-addressed copies of remote images, shippable with the app for offline deployments
+MIRROR_DIR = os.environ.get("MIRROR_DIR", os.path.join(APP_ROOT, "public", "mirror"))
+MIRROR_FETCH_TIMEOUT = float(os.environ.get("MIRROR_FETCH_TIMEOUT", 10))
+MIRROR_MAX_BYTES = int(os.environ.get("MIRROR_MAX_BYTES", 5 * 1024 * 1024))
+# After a failed fetch, clients are sent upstream for this long before the next attempt
+MIRROR_RETRY_SECONDS = float(os.environ.get("MIRROR_RETRY_SECONDS", 300))
+
+MIRROR_PATH = "/mirror/{key}"
+# Mirrored URLs keep their content once fetched, so clients may cache them for a long time
+MIRROR_CACHE_CONTROL = "public, max-age=604800"
+
+INDEX_NAME = "index.json"
+MIRROR_TYPES = {"image/png": ".png", "image/jpeg": ".jpg", "image/gif": ".gif", "image/webp": ".webp", "image/svg+xml": ".svg"}
+# Types Pillow can resize; others are always served as fetched
+RESIZABLE_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()[:20]
+
+
+def _image_type(body: bytes) -> Optional[str]:
+    mime = match_magic(body)
+    if mime is None and b"<svg" in body[:1024]:
+        mime = "image/svg+xml"
+    return mime if mime in MIRROR_TYPES else None
+
+
+class AssetMirror:
+    """Local, content-addressed mirror of the remote images the UI references
+
+    Only URLs registered through `url()` can be fetched, so the mirror is not
+    an open proxy. Each is downloaded once, at build time (`python mirror.py`)
+    or on first request, stored under its content hash and recorded in
+    index.json; resized variants are generated next to it on demand.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        # url key -> remote URL, and the sizes the UI asks for
+        self.remote: Dict[str, str] = {}
+        self.sizes: Dict[str, set] = {}
+        # remote URL -> {"file", "mime", "digest", "fetched"}
+        self.index: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._failed: Dict[str, float] = {}
+        try:
+            with open(os.path.join(root, INDEX_NAME)) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    def url(self, remote: str, size: Optional[int] = None) -> str:
+        """Local URL serving `remote`, downscaled to fit `size` pixels when given"""
+        key = _url_key(remote)
+        self.remote[key] = remote
+        self.sizes.setdefault(key, set())
+        if size:
+            self.sizes[key].add(size)
+            key = f"{key}-{size}"
+        return config.run.root_path + MIRROR_PATH.format(key=key)
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        write_atomically(os.path.join(self.root, INDEX_NAME), json.dumps(self.index, indent=2, sort_keys=True).encode("utf-8"))
+
+    async def fetch(self, key: str) -> Optional[Dict[str, Any]]:
+        """Index entry of a registered URL, downloading it first if needed"""
+        remote = self.remote[key]
+        entry = self.index.get(remote)
+        if entry is not None and os.path.exists(os.path.join(self.root, entry["file"])):
+            return entry
+        if time.monotonic() - self._failed.get(key, -MIRROR_RETRY_SECONDS) < MIRROR_RETRY_SECONDS:
+            return None
+
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            entry = self.index.get(remote)
+            if entry is not None and os.path.exists(os.path.join(self.root, entry["file"])):
+                return entry
+            try:
+                body = await self._download(remote)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning("Could not mirror %s: %s", remote, e)
+                self._failed[key] = time.monotonic()
+                return None
+            mime = _image_type(body)
+            if mime is None:
+                logger.warning("Not mirroring %s: not a supported image", remote)
+                self._failed[key] = time.monotonic()
+                return None
+
+            digest = hashlib.sha256(body).hexdigest()
+            entry = {"file": digest + MIRROR_TYPES[mime], "mime": mime, "digest": digest, "fetched": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+            os.makedirs(self.root, exist_ok=True)
+            path = os.path.join(self.root, entry["file"])
+            if not os.path.exists(path):
+                await asyncio.to_thread(write_atomically, path, body)
+            self.index[remote] = entry
+            await asyncio.to_thread(self._save_index)
+            self._failed.pop(key, None)
+            return entry
+
+    async def _download(self, remote: str) -> bytes:
+        async with httpx.AsyncClient(timeout=MIRROR_FETCH_TIMEOUT, follow_redirects=True) as client:
+            async with client.stream("GET", remote) as response:
+                response.raise_for_status()
+                chunks = []
+                size = 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > MIRROR_MAX_BYTES:
+                        raise ValueError(f"larger than {MIRROR_MAX_BYTES} bytes")
+                    chunks.append(chunk)
+        return b"".join(chunks)
+
+    async def variant(self, entry: Dict[str, Any], size: Optional[int]) -> str:
+        """File name of the entry's image downscaled to `size`, or of the original"""
+        if not size or not PREVIEWS_AVAILABLE or entry["mime"] not in RESIZABLE_TYPES:
+            return entry["file"]
+        from preview_workers import make_image_thumbnails
+
+        try:
+            result = await asyncio.to_thread(make_image_thumbnails, os.path.join(self.root, entry["file"]), self.root, [size])
+        except OSError:
+            logger.exception("Resizing mirrored %s failed", entry["file"])
+            return entry["file"]
+        return result["files"][size]
+
+    async def mirror_all(self) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Fetch every registered URL and its variants, e.g. while building a deployment"""
+        results = {}
+        for key, remote in self.remote.items():
+            self._failed.pop(key, None)
+            entry = results[remote] = await self.fetch(key)
+            if entry is not None:
+                for size in self.sizes[key]:
+                    await self.variant(entry, size)
+        return results
+
+
+asset_mirror = AssetMirror(MIRROR_DIR)
+
+
+def mirror_url(remote: str, size: Optional[int] = None) -> str:
+    """Serve a remote image from the local mirror instead of its third-party host"""
+    return asset_mirror.url(remote, size)
+
+
+async def mirror_endpoint(request: Request, key: str):
+    """A mirrored image, fetched on first use; falls back to the remote URL if that fails"""
+    url_key, _, size = key.partition("-")
+    if url_key not in asset_mirror.remote or (size and (not size.isdigit() or int(size) not in asset_mirror.sizes[url_key])):
+        raise HTTPException(status_code=404, detail="Not found")
+    entry = await asset_mirror.fetch(url_key)
+    if entry is None:
+        return RedirectResponse(asset_mirror.remote[url_key], status_code=307, headers={"Cache-Control": "no-store"})
+
+    etag = f'"{entry["digest"][:32]}{"-" + size if size else ""}"'
+    headers = {"Cache-Control": MIRROR_CACHE_CONTROL, "ETag": etag}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    filename = await asset_mirror.variant(entry, int(size) if size else None)
+    media_type = entry["mime"] if filename == entry["file"] else f"image/{os.path.splitext(filename)[1][1:]}"
+    return FileResponse(os.path.join(asset_mirror.root, filename), media_type=media_type, headers=headers)
+
+
+add_route(MIRROR_PATH, mirror_endpoint, include_in_schema=False)
+
+if __name__ == "__main__":
+    # Importing main registers the URLs the UI uses, on the importable module rather than __main__
+    import main  # noqa: F401
+    import mirror
+
+    for remote, entry in asyncio.run(mirror.asset_mirror.mirror_all()).items():
+        print(f"{'ok    ' if entry else 'FAILED'} {remote}")
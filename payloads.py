@@ -0,0 +1,156 @@
+import json
+from typing import List, Set
+
+import chainlit as cl
+
+from mirror import mirror_url
+
+# Static payloads for the demo handlers. They are built once at import and
+# shared by every message, so handlers don't rebuild the same literals per
+# request. Treat them as read-only.
+
+PROMPTS_DATA = [
+    {
+        "id": "1",
+        "title": "Summarize Content",
+        "prompt": "Please provide a concise summary focusing on the main points and key insights.",
+        "icon": "📝",
+        "category": "Analysis"
+    },
+    {
+        "id": "2", 
+        "title": "Technical Explanation",
+        "prompt": "Explain this technical concept in simple terms with practical examples.",
+        "icon": "🔧",
+        "category": "Technical"
+    },
+    {
+        "id": "3",
+        "title": "Creative Ideas",
+        "prompt": "Generate 3 innovative ideas with feasibility analysis for each.",
+        "icon": "💡",
+        "category": "Creative"
+    },
+    {
+        "id": "4",
+        "title": "Problem Solving",
+        "prompt": "Break down this problem into manageable steps with prioritized solutions.",
+        "icon": "🔍",
+        "category": "Analysis" 
+    },
+    {
+        "id": "5",
+        "title": "Code Review",
+        "prompt": "Review this code for improvements in performance, readability, and best practices.",
+        "icon": "💻",
+        "category": "Technical"
+    },
+    {
+        "id": "6",
+        "title": "Business Strategy",
+        "prompt": "Develop a strategic business approach with clear objectives and measurable outcomes.",
+        "icon": "📊",
+        "category": "Business"
+    }
+]
+
+INFO_DATA = {
+    "title": "Chainlit UI Customization Techniques",
+    "description": "Advanced UI/UX patterns for modern web applications",
+    "image_url": mirror_url("https://images.unsplash.com/photo-1555066931-4365d14bab8c?w=400&h=200&fit=crop"),
+    "category": "UI/UX Demo",
+    "features": [
+        {"icon": "🎨", "text": "Glassmorphism Effects"},
+        {"icon": "⚡", "text": "Smooth Animations"},
+        {"icon": "📱", "text": "Responsive Design"},
+        {"icon": "🌙", "text": "Dark Mode Support"},
+        {"icon": "💾", "text": "Local Storage"},
+        {"icon": "🔧", "text": "Custom Components"}
+    ],
+    "items": [
+        {
+            "title": "Custom Component System",
+            "description": "React-based custom elements with local storage integration for persistent user preferences."
+        },
+        {
+            "title": "Dynamic Info Cards",
+            "description": "Flexible card components supporting various content types, images, and interactive features."
+        },
+        {
+            "title": "Modern CSS Techniques",
+            "description": "Implementation of cutting-edge CSS features including glassmorphism, gradients, and hover effects."
+        }
+    ]
+}
+
+# Action sets as (name, label, payload) specs; cl.Action instances carry a
+# per-message id, so fresh copies are made on every send
+ACTION_SETS = {
+    "ui_demo": (
+        ("action_summary", "📝 Create Summary", {"action": "summary"}),
+        ("action_detail", "🔍 Show Details", {"action": "detail"}),
+        ("action_components", "🎨 Custom Components", {"action": "components"}),
+        ("action_cards", "📋 Info Cards", {"action": "cards"}),
+        ("action_demo", "⭐ Full Demo", {"action": "demo"}),
+        ("action_settings", "⚙️ UI Settings", {"action": "settings"}),
+    ),
+    "interactive_chat": (
+        ("action_analyze", "� Deep Analysis", {"action": "analyze"}),
+        ("action_expand", "📈 Expand Topic", {"action": "expand"}),
+        ("action_related", "🔗 Related Topics", {"action": "related"}),
+    ),
+    "summary_follow_up": (
+        ("action_deep_analysis", "🔬 Deep Analysis", {"action": "deep_analysis"}),
+        ("action_questions", "❓ Related Questions", {"action": "questions"}),
+        ("action_export", "📄 Export Summary", {"action": "export"}),
+    ),
+    "detail_follow_up": (
+        ("action_implementation", "⚙️ Implementation Guide", {"action": "implementation"}),
+        ("action_examples", "💡 Examples", {"action": "examples"}),
+        ("action_best_practices", "🎯 Best Practices", {"action": "best_practices"}),
+    ),
+}
+
+# Custom element name -> props
+ELEMENT_PROPS = {
+    "InfoCards": {"data": INFO_DATA},
+}
+
+# Serialized once at import instead of on every element construction
+SERIALIZED_PROPS = {
+    name: json.dumps(props, ensure_ascii=False, separators=(",", ":"))
+    for name, props in ELEMENT_PROPS.items()
+}
+
+
+class PrebuiltCustomElement(cl.CustomElement):
+    """CustomElement that reuses the props JSON serialized at import"""
+
+    def __post_init__(self) -> None:
+        # Same as CustomElement.__post_init__, minus the per-instance json.dumps
+        self.content = SERIALIZED_PROPS[self.name]
+        super(cl.CustomElement, self).__post_init__()
+        self.updatable = True
+
+
+def custom_element(name: str, **overrides) -> cl.CustomElement:
+    """Custom element backed by the shared, prebuilt props
+
+    Overridden props are merged into a copy and serialized per call.
+    """
+    if overrides:
+        return cl.CustomElement(name=name, props={**ELEMENT_PROPS[name], **overrides})
+    return PrebuiltCustomElement(name=name, props=ELEMENT_PROPS[name])
+
+
+def actions(action_set: str) -> List[cl.Action]:
+    """Fresh cl.Action instances for a prebuilt action set"""
+    return [
+        cl.Action(name=name, label=label, payload=payload)
+        for name, label, payload in ACTION_SETS[action_set]
+    ]
+
+
+def action_names() -> Set[str]:
+    """Names of every action any prebuilt action set can emit"""
+    return {name for specs in ACTION_SETS.values() for name, _, _ in specs}
@@ -0,0 +1,114 @@
+import contextlib
+import json
+import os
+from typing import Dict, Any, Sequence
+
+from file_utils import atomic_path, file_digest, write_atomically
+
+# Runs inside the preview process pool: keep this module free of Chainlit
+# imports so worker processes start quickly.
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is optional (see the "previews" extra)
+    Image = None
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # so is pypdfium2, used for PDF pages
+    pdfium = None
+
+THUMBNAIL_FORMAT = "webp" if Image is not None and features.check("webp") else "png"
+
+
+def _save_atomically(image, path: str):
+    """Write via a temp file so concurrent workers never expose partial output"""
+    with atomic_path(path) as temp_path:
+        image.save(temp_path, format=THUMBNAIL_FORMAT.upper())
+
+
+def _touch(out_dir: str, names: Sequence[str]):
+    """Mark reused files as recently used; the preview directory is trimmed least recently used first"""
+    for name in names:
+        with contextlib.suppress(OSError):
+            os.utime(os.path.join(out_dir, name))
+
+
+def make_image_thumbnails(path: str, out_dir: str, sizes: Sequence[int]) -> Dict[str, Any]:
+    """Decode an image once and write downscaled variants named by content hash
+
+    Returns the digest, original dimensions and {size: filename}. Variants
+    that already exist for the same content are reused without decoding.
+    """
+    digest = file_digest(path)
+    files = {size: f"{digest}-{size}.{THUMBNAIL_FORMAT}" for size in sizes}
+    meta_path = os.path.join(out_dir, f"{digest}.meta")
+    if all(os.path.exists(os.path.join(out_dir, name)) for name in files.values()) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            width, height = (int(value) for value in f.read().split())
+        _touch(out_dir, [os.path.basename(meta_path), *files.values()])
+        return {"digest": digest, "width": width, "height": height, "files": files, "cached": True}
+
+    os.makedirs(out_dir, exist_ok=True)
+    with Image.open(path) as image:
+        width, height = image.size
+        # Let JPEG decode at a reduced scale instead of full resolution
+        image.draft("RGB", (max(sizes), max(sizes)))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        for size in sorted(sizes, reverse=True):
+            image.thumbnail((size, size))
+            _save_atomically(image, os.path.join(out_dir, files[size]))
+
+    write_atomically(meta_path, f"{width} {height}")
+    return {"digest": digest, "width": width, "height": height, "files": files, "cached": False}
+
+
+def render_pdf_pages(path: str, out_dir: str, pages: Sequence[int], width: int, digest: str = None) -> Dict[str, Any]:
+    """Open a PDF once, record its page count and metadata, and render the requested pages
+
+    Pages are 1-based; numbers past the end are ignored. Rendered pages and
+    document info are stored by content hash and reused on later calls.
+    """
+    digest = digest or file_digest(path)
+    info_path = os.path.join(out_dir, f"{digest}.pdf.json")
+    info = None
+    if os.path.exists(info_path):
+        with open(info_path) as f:
+            info = json.load(f)
+    files = {page: f"{digest}-p{page}-{width}.{THUMBNAIL_FORMAT}" for page in pages}
+    missing = [page for page in pages if not os.path.exists(os.path.join(out_dir, files[page]))]
+    if info is not None:
+        missing = [page for page in missing if 1 <= page <= info["pages"]]
+    cached = info is not None and not missing
+
+    if not cached:
+        os.makedirs(out_dir, exist_ok=True)
+        pdf = pdfium.PdfDocument(path)
+        try:
+            if info is None:
+                info = {"pages": len(pdf), "metadata": pdf.get_metadata_dict(skip_empty=True)}
+                write_atomically(info_path, json.dumps(info))
+            for page_number in missing:
+                if not 1 <= page_number <= info["pages"]:
+                    continue
+                page = pdf[page_number - 1]
+                try:
+                    bitmap = page.render(scale=width / page.get_width())
+                    _save_atomically(bitmap.to_pil(), os.path.join(out_dir, files[page_number]))
+                finally:
+                    page.close()
+        finally:
+            pdf.close()
+    else:
+        _touch(out_dir, [os.path.basename(info_path), *files.values()])
+
+    return {
+        "digest": digest,
+        "pages": info["pages"],
+        "metadata": info["metadata"],
+        "files": {page: name for page, name in files.items() if 1 <= page <= info["pages"]},
+        "cached": cached,
+    }
@@ -0,0 +1,345 @@
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import os
+import re
+import secrets
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, Optional, Tuple
+
+from chainlit.config import config
+from starlette.responses import FileResponse, JSONResponse
+
+from preview_workers import make_image_thumbnails, render_pdf_pages
+from server_routes import add_route
+from session_state import session_store
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_DIR = os.environ.get("PREVIEW_DIR", os.path.join(".files", ".previews"))
+# Disk budget for derived images and document info; the least recently used files are deleted first
+PREVIEW_DISK_MAX_BYTES = int(os.environ.get("PREVIEW_DISK_MAX_MB", 1024)) * 1024 * 1024
+PREVIEW_SWEEP_SECONDS = float(os.environ.get("PREVIEW_SWEEP_SECONDS", 300))
+# Bounding boxes (px) of the derived images: a sidebar thumbnail and a larger view
+IMAGE_PREVIEW_SIZES = tuple(int(size) for size in os.environ.get("IMAGE_PREVIEW_SIZES", "160,640").split(","))
+# Decoding is CPU-bound; this many processes is all a batch of uploads can use
+PREVIEW_WORKERS = int(os.environ.get("PREVIEW_WORKERS", 2))
+# Images larger than this are not decoded at all (the original is offered instead)
+PREVIEW_MAX_BYTES = int(os.environ.get("PREVIEW_MAX_BYTES", 100 * 1024 * 1024))
+# Originals remembered on this worker; older ones are looked up in the session store again
+PREVIEW_ORIGINALS_MAX = int(os.environ.get("PREVIEW_ORIGINALS_MAX", 1000))
+# Width (px) PDF pages are rendered at, and the most pages rendered per request
+PDF_PAGE_WIDTH = int(os.environ.get("PDF_PAGE_WIDTH", 800))
+PDF_MAX_PAGE_RANGE = int(os.environ.get("PDF_MAX_PAGE_RANGE", 10))
+
+PREVIEW_PATH = "/previews/{filename}"
+ORIGINAL_PATH = "/previews/original/{token}"
+PDF_PAGES_PATH = "/previews/pdf/{token}/pages"
+# {digest}-{size}.ext for images, {digest}-p{page}-{width}.ext for PDF pages
+PREVIEW_FILENAME = re.compile(r"^([0-9a-f]{64})-(?:p(\d+)-)?(\d+)\.(webp|png)$")
+
+PREVIEWS_AVAILABLE = importlib.util.find_spec("PIL") is not None
+PDF_PREVIEWS_AVAILABLE = PREVIEWS_AVAILABLE and importlib.util.find_spec("pypdfium2") is not None
+
+_pool: Optional[ProcessPoolExecutor] = None
+_sweeper: Optional[asyncio.Task] = None
+_disk = {"disk_bytes": 0, "files": 0, "evicted_files": 0, "evicted_bytes": 0, "regenerated": 0}
+# Filename -> render in progress, so concurrent requests for a pruned preview share one
+_regenerating: Dict[str, asyncio.Future] = {}
+
+# token -> (path, mime, session_id, digest) for originals served on demand
+_originals: "OrderedDict[str, Tuple[str, str, str, Optional[str]]]" = OrderedDict()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Spawned workers only import preview_workers, not the Chainlit app
+        _pool = ProcessPoolExecutor(PREVIEW_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _reset_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def preview_url(filename: str) -> str:
+    return config.run.root_path + PREVIEW_PATH.format(filename=filename)
+
+
+def _remember_original(token: str, entry: Tuple[str, str, str, Optional[str]]):
+    _originals[token] = entry
+    while len(_originals) > PREVIEW_ORIGINALS_MAX:
+        _originals.popitem(last=False)
+
+
+def register_original(path: str, mime: str, session_id: str, digest: Optional[str] = None) -> str:
+    """Make an upload downloadable by its owner's session and return its token
+
+    The token is shared through the session store, so it resolves on every worker.
+    """
+    token = secrets.token_urlsafe(24)
+    _remember_original(token, (path, mime, session_id, digest))
+    session_store.put_handle(token, session_id, {"kind": "original", "path": path, "mime": mime, "digest": digest})
+    return token
+
+
+async def _get_original(token: str) -> Optional[Tuple[str, str, str, Optional[str]]]:
+    entry = _originals.get(token)
+    if entry is not None:
+        _originals.move_to_end(token)
+        return entry
+    handle = await session_store.handle(token)
+    if handle is None or handle[1].get("kind") != "original":
+        return None
+    session_id, data = handle
+    entry = (data["path"], data["mime"], session_id, data["digest"])
+    _remember_original(token, entry)
+    return entry
+
+
+def _register_source(digest: str, path: str, session_id: str):
+    """Remember which upload a digest's previews are rendered from, so pruned ones can be rendered again"""
+    session_store.put_handle(f"source:{digest}", session_id, {"kind": "source", "path": path})
+
+
+def original_url(token: str) -> str:
+    return config.run.root_path + ORIGINAL_PATH.format(token=token)
+
+
+async def _run_in_pool(name: str, func, *args) -> Optional[Dict[str, Any]]:
+    """Run a preview worker function, returning None if it fails"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_pool(), func, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        logger.warning("Preview worker pool broke while processing %s", name)
+        _reset_pool()
+    except Exception:
+        logger.warning("Could not create a preview for %s", name, exc_info=True)
+    return None
+
+
+def _within_limit(path: str) -> bool:
+    try:
+        return os.path.getsize(path) <= PREVIEW_MAX_BYTES
+    except OSError:
+        return False
+
+
+async def image_preview_props(path: str, name: str, mime: str, session_id: str) -> Optional[Dict[str, Any]]:
+    """Downscale an uploaded image in the worker pool and return ImagePreview props
+
+    Returns None when no preview can be made (Pillow missing, file too large
+    or not decodable); the caller then falls back to the plain image element.
+    """
+    if not PREVIEWS_AVAILABLE or not _within_limit(path):
+        return None
+    result = await _run_in_pool(name, make_image_thumbnails, path, PREVIEW_DIR, IMAGE_PREVIEW_SIZES)
+    if result is None:
+        return None
+
+    _register_source(result["digest"], path, session_id)
+    sizes = sorted(result["files"])
+    return {
+        "name": name,
+        "thumbnail": preview_url(result["files"][sizes[0]]),
+        "preview": preview_url(result["files"][sizes[-1]]),
+        "original": original_url(register_original(path, mime, session_id)),
+        "width": result["width"],
+        "height": result["height"],
+        "cached": result["cached"],
+    }
+
+
+async def pdf_preview_props(path: str, name: str, mime: str, session_id: str) -> Optional[Dict[str, Any]]:
+    """Read a PDF's page count and metadata, render its first page, and return PdfPreview props
+
+    Further pages are rendered on request through PDF_PAGES_PATH. Returns None
+    when pypdfium2 is missing or the document cannot be opened.
+    """
+    if not PDF_PREVIEWS_AVAILABLE:
+        return None
+    result = await _run_in_pool(name, render_pdf_pages, path, PREVIEW_DIR, (1,), PDF_PAGE_WIDTH)
+    if result is None:
+        return None
+
+    token = register_original(path, mime, session_id, result["digest"])
+    _register_source(result["digest"], path, session_id)
+    metadata = result["metadata"]
+    return {
+        "name": name,
+        "pages": result["pages"],
+        "title": metadata.get("Title", ""),
+        "author": metadata.get("Author", ""),
+        "firstPage": preview_url(result["files"][1]) if result["files"] else "",
+        "pagesEndpoint": config.run.root_path + PDF_PAGES_PATH.format(token=token),
+        "pageRange": PDF_MAX_PAGE_RANGE,
+        "original": original_url(token),
+        "cached": result["cached"],
+    }
+
+
+# Upload kind -> builder of its custom preview element props
+PREVIEW_BUILDERS = {
+    "image": image_preview_props,
+    "pdf": pdf_preview_props,
+}
+
+
+def close_session_previews(session_id: str):
+    """Forget the originals registered by a session, once its uploads are evicted"""
+    for token in [key for key, entry in _originals.items() if entry[2] == session_id]:
+        del _originals[token]
+
+
+def prune_previews(directory: str = PREVIEW_DIR, max_bytes: int = PREVIEW_DISK_MAX_BYTES):
+    """Delete least recently used files until `directory` fits in `max_bytes`
+
+    Workers touch the files they reuse, so modification time is last use.
+    Anything deleted is derived from an upload and is rendered again if asked for.
+    """
+    files = []
+    stale = time.time() - 3600
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        entries = []
+    for entry in entries:
+        try:
+            if entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                # Temp files of writes still in progress are left alone unless a crash orphaned them
+                if entry.name.startswith(".") and stat.st_mtime > stale:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            continue
+    total = sum(size for _, size, _ in files)
+    remaining = len(files)
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        remaining -= 1
+        _disk["evicted_files"] += 1
+        _disk["evicted_bytes"] += size
+    _disk["disk_bytes"] = total
+    _disk["files"] = remaining
+
+
+async def _sweep_previews():
+    while True:
+        try:
+            await asyncio.to_thread(prune_previews)
+        except Exception:
+            logger.exception("Preview sweep failed")
+        await asyncio.sleep(PREVIEW_SWEEP_SECONDS)
+
+
+def start_previews():
+    """Start keeping PREVIEW_DIR within its disk budget"""
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = asyncio.get_running_loop().create_task(_sweep_previews())
+
+
+def shutdown_previews():
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        _sweeper = None
+    _reset_pool()
+
+
+def preview_stats() -> Dict[str, int]:
+    return {**_disk, "max_bytes": PREVIEW_DISK_MAX_BYTES}
+
+
+async def _render_again(match: "re.Match") -> bool:
+    """Render a pruned preview from its upload, if a live session still holds the upload"""
+    digest, page, size, _ = match.groups()
+    handle = await session_store.handle(f"source:{digest}")
+    if handle is None or handle[1].get("kind") != "source":
+        return False
+    path = handle[1]["path"]
+    if not os.path.exists(path):
+        return False
+    # Only the sizes this app renders, so a request cannot have arbitrary ones made
+    if page is not None and int(size) == PDF_PAGE_WIDTH and PDF_PREVIEWS_AVAILABLE:
+        result = await _run_in_pool(path, render_pdf_pages, path, PREVIEW_DIR, (int(page),), PDF_PAGE_WIDTH, digest)
+    elif page is None and int(size) in IMAGE_PREVIEW_SIZES and PREVIEWS_AVAILABLE:
+        result = await _run_in_pool(path, make_image_thumbnails, path, PREVIEW_DIR, IMAGE_PREVIEW_SIZES)
+    else:
+        return False
+    if result is not None:
+        _disk["regenerated"] += 1
+    return result is not None
+
+
+async def preview_endpoint(filename: str):
+    """Serve a derived image; names are content hashes, so they never change
+
+    A preview pruned for the disk budget is rendered again from its upload.
+    """
+    match = PREVIEW_FILENAME.match(filename)
+    if not match:
+        return JSONResponse({"detail": "Preview not found"}, status_code=404)
+    path = os.path.join(PREVIEW_DIR, filename)
+    try:
+        # Serving counts as use for the disk budget
+        os.utime(path)
+    except OSError:
+        pending = _regenerating.get(filename)
+        if pending is None:
+            pending = _regenerating[filename] = asyncio.ensure_future(_render_again(match))
+            pending.add_done_callback(lambda _: _regenerating.pop(filename, None))
+        if not await asyncio.shield(pending) or not os.path.exists(path):
+            return JSONResponse({"detail": "Preview not found"}, status_code=404)
+    return FileResponse(path, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+
+async def original_endpoint(token: str):
+    """Serve the full-resolution upload behind a preview"""
+    entry = await _get_original(token)
+    if entry is None or not os.path.exists(entry[0]):
+        return JSONResponse({"detail": "File not found"}, status_code=404)
+    path, mime, _, _ = entry
+    # FileResponse answers Range requests, so PDF viewers can fetch pages incrementally
+    return FileResponse(path, media_type=mime, headers={"Cache-Control": "private, max-age=3600"})
+
+
+async def pdf_pages_endpoint(token: str, start: int = 1, end: Optional[int] = None):
+    """Render pages start..end (1-based, inclusive) of a PDF and return their URLs"""
+    entry = await _get_original(token)
+    if entry is None or entry[3] is None:
+        return JSONResponse({"detail": "Document not found"}, status_code=404)
+    path, _, _, digest = entry
+    start = max(start, 1)
+    end = min(max(end or start, start), start + PDF_MAX_PAGE_RANGE - 1)
+    if not os.path.exists(path):
+        return JSONResponse({"detail": "File no longer available"}, status_code=410)
+    result = await _run_in_pool(path, render_pdf_pages, path, PREVIEW_DIR, tuple(range(start, end + 1)), PDF_PAGE_WIDTH, digest)
+    if result is None:
+        return JSONResponse({"detail": "Could not render pages"}, status_code=500)
+    return JSONResponse({
+        "pages": result["pages"],
+        "urls": {page: preview_url(filename) for page, filename in result["files"].items()},
+    })
+
+
+add_route(ORIGINAL_PATH, original_endpoint, include_in_schema=False)
+add_route(PDF_PAGES_PATH, pdf_pages_endpoint, include_in_schema=False)
+add_route(PREVIEW_PATH, preview_endpoint, include_in_schema=False)
@@ -0,0 +1,271 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+
+from chainlit.auth import require_login
+from chainlit.config import config
+from chainlit.server import UserParam
+from fastapi import Request
+from starlette.responses import JSONResponse
+
+from payloads import PROMPTS_DATA
+from server_routes import add_route
+
+PROMPTS_DB = os.environ.get("PROMPTS_DB", "prompts.db")
+PROMPTS_PAGE_SIZE = int(os.environ.get("PROMPTS_PAGE_SIZE", 20))
+PROMPTS_MAX_PAGE_SIZE = 100
+# Most changes returned by one sync request; clients page through the rest
+PROMPTS_MAX_CHANGES = 500
+# Most add/update/delete operations accepted in one request; larger batches are rejected for the client to split
+PROMPTS_MAX_BATCH = 100
+
+PROMPTS_PATH = "/prompts"
+PROMPT_CHANGES_PATH = "/prompts/changes"
+
+PROMPT_FIELDS = ("title", "prompt", "icon", "category")
+FIELD_MAX_LENGTHS = {"title": 200, "prompt": 20000, "icon": 16, "category": 64}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS prompts (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    icon TEXT NOT NULL DEFAULT '💡',
+    category TEXT NOT NULL DEFAULT 'General',
+    created TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS prompts_by_category ON prompts (deleted, category, title);
+CREATE INDEX IF NOT EXISTS prompts_by_version ON prompts (version);
+CREATE VIRTUAL TABLE IF NOT EXISTS prompts_fts USING fts5(
+    title, prompt, category, content='prompts', content_rowid='rowid'
+);
+CREATE TRIGGER IF NOT EXISTS prompts_fts_insert AFTER INSERT ON prompts BEGIN
+    INSERT INTO prompts_fts (rowid, title, prompt, category) VALUES (new.rowid, new.title, new.prompt, new.category);
+END;
+CREATE TRIGGER IF NOT EXISTS prompts_fts_update AFTER UPDATE ON prompts BEGIN
+    INSERT INTO prompts_fts (prompts_fts, rowid, title, prompt, category) VALUES ('delete', old.rowid, old.title, old.prompt, old.category);
+    INSERT INTO prompts_fts (rowid, title, prompt, category) VALUES (new.rowid, new.title, new.prompt, new.category);
+END;
+"""
+
+COLUMNS = "id, title, prompt, icon, category, created, version, deleted"
+QUALIFIED_COLUMNS = ", ".join(f"p.{column}" for column in COLUMNS.split(", "))
+
+
+def _row(row: sqlite3.Row) -> Dict[str, Any]:
+    item = dict(row)
+    if not item.pop("deleted"):
+        return item
+    return {"id": item["id"], "version": item["version"], "deleted": True}
+
+
+def _match_expression(query: str) -> Optional[str]:
+    """FTS5 query matching every word of `query` as a prefix"""
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words) or None
+
+
+def _clean_fields(fields: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        key: str(fields[key])[:FIELD_MAX_LENGTHS[key]]
+        for key in PROMPT_FIELDS if fields.get(key) is not None
+    }
+
+
+class PromptStore:
+    """Shared prompt library in SQLite with category and full-text indexes
+
+    Every write bumps a library-wide version stored on the changed row;
+    deletes leave a tombstone, so clients can sync by asking for the rows
+    changed since the last version they saw. The database is shared by
+    all workers, so versions are allocated from it inside the writing
+    transaction, never from a counter in this process.
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            if self._db.execute("SELECT COUNT(*) FROM prompts").fetchone()[0] == 0:
+                self._seed()
+
+    def _current_version(self) -> int:
+        """Latest version in the database; caller holds the lock"""
+        return self._db.execute("SELECT COALESCE(MAX(version), 0) FROM prompts").fetchone()[0]
+
+    def categories(self) -> List[str]:
+        """Categories of the live prompts"""
+        with self._lock:
+            rows = self._db.execute("SELECT DISTINCT category FROM prompts WHERE deleted = 0 ORDER BY category").fetchall()
+        return [row[0] for row in rows]
+
+    def _seed(self):
+        created = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self._db.executemany(
+            "INSERT INTO prompts (id, title, prompt, icon, category, created, version) VALUES (?, ?, ?, ?, ?, ?, 1)",
+            [(p["id"], p["title"], p["prompt"], p["icon"], p["category"], created) for p in PROMPTS_DATA],
+        )
+
+    def query(self, text: str = "", category: str = "", offset: int = 0, limit: int = PROMPTS_PAGE_SIZE) -> Dict[str, Any]:
+        """One page of live prompts, optionally filtered by category and full-text search"""
+        limit = min(max(limit, 1), PROMPTS_MAX_PAGE_SIZE)
+        offset = max(offset, 0)
+        match = _match_expression(text)
+        where = ["p.deleted = 0"]
+        params: List[Any] = []
+        if category:
+            where.append("p.category = ?")
+            params.append(category)
+        if match:
+            # CROSS JOIN keeps the FTS match as the driving table
+            source = "prompts_fts f CROSS JOIN prompts p ON p.rowid = f.rowid"
+            where.insert(0, "prompts_fts MATCH ?")
+            params.insert(0, match)
+            order = "f.rank"
+        else:
+            source = "prompts p"
+            order = "p.rowid"
+        condition = " AND ".join(where)
+        with self._lock:
+            # Read first: a write landing in between is then re-sent by the next sync, not skipped
+            version = self._current_version()
+            total = self._db.execute(f"SELECT COUNT(*) FROM {source} WHERE {condition}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT {QUALIFIED_COLUMNS} FROM {source} "
+                f"WHERE {condition} ORDER BY {order} LIMIT ? OFFSET ?",
+                [*params, limit, offset],
+            ).fetchall()
+        return {"items": [_row(row) for row in rows], "total": total, "offset": offset, "limit": limit, "version": version}
+
+    def changes_since(self, version: int) -> Dict[str, Any]:
+        """Rows (or tombstones) changed after `version`, oldest first"""
+        with self._lock:
+            # Rows are capped at the version read first, so a concurrent commit is left for the next sync
+            current = self._current_version()
+            rows = self._db.execute(
+                f"SELECT {COLUMNS} FROM prompts WHERE version > ? AND version <= ? ORDER BY version LIMIT ?",
+                (version, current, PROMPTS_MAX_CHANGES + 1),
+            ).fetchall()
+        more = len(rows) > PROMPTS_MAX_CHANGES
+        rows = rows[:PROMPTS_MAX_CHANGES]
+        return {
+            "changes": [_row(row) for row in rows],
+            "version": rows[-1]["version"] if more else current,
+            "more": more,
+        }
+
+    def apply(self, changes: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Apply add/update/delete operations in one transaction
+
+        Each change is {"op", "id", "fields"}; ids of added prompts may be
+        chosen by the client. Returns the resulting rows and the new version.
+        """
+        if len(changes) > PROMPTS_MAX_BATCH:
+            raise ValueError(f"At most {PROMPTS_MAX_BATCH} changes per request")
+        results = []
+        with self._lock, self._db:
+            # Take the write lock before reading the version, so no other worker can allocate the same one
+            self._db.execute("BEGIN IMMEDIATE")
+            version = self._current_version()
+            for change in changes:
+                if not isinstance(change, dict):
+                    raise ValueError("Each change must be an object")
+                op = change.get("op")
+                fields = _clean_fields(change.get("fields") or {})
+                version += 1
+                if op == "add":
+                    if not fields.get("title") or not fields.get("prompt"):
+                        raise ValueError("A prompt needs a title and content")
+                    prompt_id = str(change.get("id") or uuid.uuid4().hex)[:64]
+                    self._db.execute(
+                        "INSERT INTO prompts (id, title, prompt, icon, category, created, version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (prompt_id, fields["title"], fields["prompt"], fields.get("icon", "💡"), fields.get("category", "General"),
+                         time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), version),
+                    )
+                elif op == "update":
+                    prompt_id = str(change.get("id"))
+                    assignments = "".join(f"{key} = ?, " for key in fields)
+                    self._db.execute(
+                        f"UPDATE prompts SET {assignments}version = ? WHERE id = ? AND deleted = 0",
+                        (*fields.values(), version, prompt_id),
+                    )
+                elif op == "delete":
+                    prompt_id = str(change.get("id"))
+                    self._db.execute("UPDATE prompts SET deleted = 1, version = ? WHERE id = ? AND deleted = 0", (version, prompt_id))
+                else:
+                    raise ValueError(f"Unknown change operation: {op!r}")
+                row = self._db.execute(f"SELECT {COLUMNS} FROM prompts WHERE id = ?", (prompt_id,)).fetchone()
+                if row is None:
+                    raise KeyError(prompt_id)
+                results.append(_row(row))
+        return {"applied": results, "version": version}
+
+
+prompt_store = PromptStore(PROMPTS_DB)
+
+
+async def prompts_list_props(editable: bool = True) -> Dict[str, Any]:
+    """CustomPromptsList props: the first page plus where to fetch the rest
+
+    The library is shared, so it is only editable when users sign in.
+    """
+    first_page, categories = await asyncio.gather(
+        asyncio.to_thread(prompt_store.query),
+        asyncio.to_thread(prompt_store.categories),
+    )
+    return {
+        "endpoint": config.run.root_path + PROMPTS_PATH,
+        "changesEndpoint": config.run.root_path + PROMPT_CHANGES_PATH,
+        "firstPage": first_page,
+        "categories": categories,
+        "pageSize": PROMPTS_PAGE_SIZE,
+        "maxBatch": PROMPTS_MAX_BATCH,
+        "editable": editable and bool(require_login()),
+    }
+
+
+async def prompts_endpoint(current_user: UserParam, q: str = "", category: str = "", offset: int = 0, limit: int = PROMPTS_PAGE_SIZE):
+    """Search the library, one page at a time"""
+    return JSONResponse(await asyncio.to_thread(prompt_store.query, q, category, offset, limit))
+
+
+async def prompt_changes_endpoint(current_user: UserParam, since: int = 0):
+    """Everything changed after the version a client last saw"""
+    return JSONResponse(await asyncio.to_thread(prompt_store.changes_since, since))
+
+
+async def apply_prompt_changes_endpoint(request: Request, current_user: UserParam):
+    """Apply a batch of add/update/delete operations sent by the element"""
+    # Like Chainlit's own write routes: anonymous users may read but not change shared data
+    if not current_user:
+        return JSONResponse({"detail": "Unauthorized"}, status_code=401)
+    body = await request.json()
+    changes = body.get("changes") if isinstance(body, dict) else None
+    if not isinstance(changes, list):
+        return JSONResponse({"detail": "Expected {\"changes\": [...]}"}, status_code=422)
+    if len(changes) > PROMPTS_MAX_BATCH:
+        return JSONResponse(
+            {"detail": f"At most {PROMPTS_MAX_BATCH} changes per request", "max_batch": PROMPTS_MAX_BATCH},
+            status_code=413,
+        )
+    try:
+        return JSONResponse(await asyncio.to_thread(prompt_store.apply, changes))
+    except KeyError as e:
+        return JSONResponse({"detail": f"Prompt {e.args[0]} not found"}, status_code=404)
+    except (ValueError, sqlite3.IntegrityError) as e:
+        return JSONResponse({"detail": str(e)}, status_code=422)
+
+
+add_route(PROMPTS_PATH, prompts_endpoint, include_in_schema=False)
+add_route(PROMPT_CHANGES_PATH, prompt_changes_endpoint, include_in_schema=False)
+add_route(PROMPT_CHANGES_PATH, apply_prompt_changes_endpoint, methods=("POST",), include_in_schema=False)
@@ -1,61 +1,166 @@
-import React, { useState, useEffect } from 'react';
-
-export default function CustomPromptsList({ data = [], onPromptSelect, editable = false }) {
-  const [prompts, setPrompts] = useState(data);
-  const [newPrompt, setNewPrompt] = useState({ title: '', prompt: '', icon: '💡', category: 'General' });
+import React, { useState, useEffect, useRef } from 'react';
+
+const EMPTY_PROMPT = { title: '', prompt: '', icon: '💡', category: 'General' };
+const SYNC_INTERVAL_MS = 15000;
+
+export default function CustomPromptsList({
+  endpoint = '',
+  changesEndpoint = '',
+  firstPage = null,
+  categories = ['General', 'Development', 'Business', 'Creative', 'Analysis'],
+  pageSize = 20,
+  maxBatch = 100,
+  onPromptSelect,
+  editable = false
+}) {
+  // Only the current page lives in the browser; the library itself stays on the server
+  const [page, setPage] = useState(firstPage || { items: [], total: 0, offset: 0, version: 0 });
+  const [search, setSearch] = useState('');
+  const [category, setCategory] = useState('');
+  const [newPrompt, setNewPrompt] = useState(EMPTY_PROMPT);
   const [showAddForm, setShowAddForm] = useState(false);
   const [editingId, setEditingId] = useState(null);
+  const [staleCount, setStaleCount] = useState(0);
+  const [error, setError] = useState(null);
+  const version = useRef(page.version);
+  const firstRender = useRef(true);
+
+  const request = async (url, options) => {
+    const response = await fetch(url, { credentials: 'same-origin', ...options });
+    const data = await response.json();
+    if (!response.ok) {
+      throw new Error(data.detail || `Request failed (${response.status})`);
+    }
+    return data;
+  };
+
+  // Fetch one page of the filtered library
+  const loadPage = async (offset = 0) => {
+    try {
+      setError(null);
+      const params = new URLSearchParams({ q: search, category, offset, limit: pageSize });
+      const data = await request(`${endpoint}?${params}`);
+      version.current = Math.max(version.current, data.version);
+      setPage(data);
+      setStaleCount(0);
+    } catch (err) {
+      setError(err.message);
+    }
+  };
 
-  // Load prompts from local storage
+  // Re-query when the search or category changes, debounced while typing
   useEffect(() => {
-    if (data.length === 0) {
-      const savedPrompts = localStorage.getItem('chainlit-custom-prompts');
-      if (savedPrompts) {
-        try {
-          setPrompts(JSON.parse(savedPrompts));
-        } catch (error) {
-          console.error('Error loading prompts from localStorage:', error);
+    if (firstRender.current) {
+      firstRender.current = false;
+      return;
+    }
+    const timer = setTimeout(() => loadPage(0), 250);
+    return () => clearTimeout(timer);
+  }, [search, category]);
+
+  // Merge a list of changed rows into the visible page
+  const mergeChanges = (changes) => {
+    let unseen = 0;
+    setPage((current) => {
+      const byId = new Map(changes.map((change) => [change.id, change]));
+      const items = [];
+      for (const item of current.items) {
+        const change = byId.get(item.id);
+        byId.delete(item.id);
+        if (!change) {
+          items.push(item);
+        } else if (!change.deleted) {
+          items.push(change);
         }
       }
-    } else {
-      setPrompts(data);
+      unseen = [...byId.values()].filter((change) => !change.deleted).length;
+      return { ...current, items, total: current.total - (current.items.length - items.length) };
+    });
+    if (unseen) {
+      setStaleCount((count) => count + unseen);
     }
-  }, [data]);
+  };
 
-  // Save prompts to local storage
-  const savePrompts = (updatedPrompts) => {
-    setPrompts(updatedPrompts);
-    localStorage.setItem('chainlit-custom-prompts', JSON.stringify(updatedPrompts));
+  // Pick up edits made by other users without reloading the page
+  useEffect(() => {
+    if (!changesEndpoint) {
+      return;
+    }
+    const timer = setInterval(async () => {
+      if (document.hidden) {
+        return;
+      }
+      try {
+        let more = true;
+        while (more) {
+          const data = await request(`${changesEndpoint}?since=${version.current}`);
+          version.current = data.version;
+          more = data.more;
+          if (data.changes.length) {
+            mergeChanges(data.changes);
+          }
+        }
+      } catch (err) {
+        // Try again on the next tick
+      }
+    }, SYNC_INTERVAL_MS);
+    return () => clearInterval(timer);
+  }, [changesEndpoint]);
+
+  // Send add/update/delete operations, split into batches the server accepts
+  const sendChanges = async (changes) => {
+    try {
+      setError(null);
+      const applied = [];
+      for (let start = 0; start < changes.length; start += maxBatch) {
+        const data = await request(changesEndpoint, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ changes: changes.slice(start, start + maxBatch) })
+        });
+        applied.push(...data.applied);
+      }
+      return applied;
+    } catch (err) {
+      setError(err.message);
+      return null;
+    }
   };
 
-  // Add prompt
-  const addPrompt = () => {
-    if (newPrompt.title && newPrompt.prompt) {
-      const prompt = {
-        id: Date.now().toString(),
-        ...newPrompt,
-        created: new Date().toISOString()
-      };
-      const updatedPrompts = [...prompts, prompt];
-      savePrompts(updatedPrompts);
-      setNewPrompt({ title: '', prompt: '', icon: '💡', category: 'General' });
-      setShowAddForm(false);
+  // Add or edit a prompt
+  const savePrompt = async () => {
+    if (!newPrompt.title || !newPrompt.prompt) {
+      return;
     }
+    const { title, prompt, icon, category: promptCategory } = newPrompt;
+    const fields = { title, prompt, icon, category: promptCategory };
+    const applied = await sendChanges([editingId ? { op: 'update', id: editingId, fields } : { op: 'add', fields }]);
+    if (!applied) {
+      return;
+    }
+    if (editingId) {
+      mergeChanges(applied);
+    } else {
+      setPage((current) => ({ ...current, items: [...applied, ...current.items], total: current.total + 1 }));
+    }
+    setNewPrompt(EMPTY_PROMPT);
+    setEditingId(null);
+    setShowAddForm(false);
   };
 
   // Delete prompt
-  const deletePrompt = (id) => {
-    const updatedPrompts = prompts.filter(p => p.id !== id);
-    savePrompts(updatedPrompts);
+  const deletePrompt = async (id) => {
+    const applied = await sendChanges([{ op: 'delete', id }]);
+    if (applied) {
+      mergeChanges(applied);
+    }
   };
 
   // Edit prompt
-  const editPrompt = (id, updatedData) => {
-    const updatedPrompts = prompts.map(p => 
-      p.id === id ? { ...p, ...updatedData } : p
-    );
-    savePrompts(updatedPrompts);
-    setEditingId(null);
+  const startEditing = (prompt) => {
+    setNewPrompt({ title: prompt.title, prompt: prompt.prompt, icon: prompt.icon, category: prompt.category });
+    setEditingId(prompt.id);
+    setShowAddForm(true);
   };
 
   // Handle prompt selection
@@ -75,8 +180,9 @@ export default function CustomPromptsList({ data = [], onPromptSelect, editable
     }
   };
 
-  const categories = ['General', 'Development', 'Business', 'Creative', 'Analysis'];
   const icons = ['💡', '🔥', '⚡', '🚀', '💻', '📊', '🎨', '📝', '🔍', '⭐'];
+  const prompts = page.items;
+  const lastShown = Math.min(page.offset + prompts.length, page.total);
 
   return (
     <div className="custom-prompts-container">
@@ -363,6 +469,41 @@ export default function CustomPromptsList({ data = [], onPromptSelect, editable
           line-height: 1.5;
         }
 
+        .prompts-toolbar {
+          display: flex;
+          gap: 8px;
+          margin-bottom: 16px;
+        }
+
+        .prompts-toolbar .form-input {
+          flex: 1;
+        }
+
+        .prompts-toolbar select.form-input {
+          flex: 0 0 160px;
+        }
+
+        .prompts-pager {
+          display: flex;
+          justify-content: space-between;
+          align-items: center;
+          font-size: 13px;
+          color: var(--text-muted, #6b7280);
+        }
+
+        .prompts-notice {
+          margin-bottom: 12px;
+          font-size: 13px;
+          color: var(--primary-color, #667eea);
+          cursor: pointer;
+        }
+
+        .prompts-error {
+          margin-bottom: 12px;
+          font-size: 13px;
+          color: #dc2626;
+        }
+
         @media (max-width: 768px) {
           .custom-prompts-container {
             padding: 16px;
@@ -389,13 +530,40 @@ export default function CustomPromptsList({ data = [], onPromptSelect, editable
         {editable && (
           <button 
             className="add-button"
-            onClick={() => setShowAddForm(!showAddForm)}
+            onClick={() => {
+              setNewPrompt(EMPTY_PROMPT);
+              setEditingId(null);
+              setShowAddForm(!showAddForm);
+            }}
           >
             ➕ Add Prompt
           </button>
         )}
       </div>
 
+      <div className="prompts-toolbar">
+        <input
+          className="form-input"
+          type="search"
+          value={search}
+          onChange={(e) => setSearch(e.target.value)}
+          placeholder={`Search ${page.total.toLocaleString()} prompts`}
+        />
+        <select className="form-input" value={category} onChange={(e) => setCategory(e.target.value)}>
+          <option value="">All categories</option>
+          {categories.map(cat => (
+            <option key={cat} value={cat}>{cat}</option>
+          ))}
+        </select>
+      </div>
+
+      {error && <div className="prompts-error">{error}</div>}
+      {staleCount > 0 && (
+        <div className="prompts-notice" onClick={() => loadPage(page.offset)}>
+          {staleCount} new or changed prompt{staleCount === 1 ? '' : 's'} · refresh
+        </div>
+      )}
+
       {showAddForm && editable && (
         <div className="add-form">
           <div className="form-row">
@@ -444,11 +612,11 @@ export default function CustomPromptsList({ data = [], onPromptSelect, editable
             />
           </div>
           <div className="form-actions">
-            <button className="btn btn-secondary" onClick={() => setShowAddForm(false)}>
+            <button className="btn btn-secondary" onClick={() => { setShowAddForm(false); setEditingId(null); }}>
               Cancel
             </button>
-            <button className="btn btn-primary" onClick={addPrompt}>
-              Add
+            <button className="btn btn-primary" onClick={savePrompt}>
+              {editingId ? 'Save' : 'Add'}
             </button>
           </div>
         </div>
@@ -457,7 +625,7 @@ export default function CustomPromptsList({ data = [], onPromptSelect, editable
       {prompts.length === 0 ? (
         <div className="empty-state">
           <div className="empty-icon">💭</div>
-          <div className="empty-title">No Custom Prompts</div>
+          <div className="empty-title">{search || category ? 'No Matching Prompts' : 'No Custom Prompts'}</div>
           <div className="empty-description">
             Add prompts to template frequently used messages.
             {editable && " You can create new prompts using the 'Add Prompt' button above."}
@@ -486,7 +654,7 @@ export default function CustomPromptsList({ data = [], onPromptSelect, editable
                     className="action-btn"
                     onClick={(e) => {
                       e.stopPropagation();
-                      setEditingId(prompt.id);
+                      startEditing(prompt);
                     }}
                   >
                     ✏️
@@ -506,6 +674,20 @@ export default function CustomPromptsList({ data = [], onPromptSelect, editable
           ))}
         </div>
       )}
+
+      {page.total > pageSize && (
+        <div className="prompts-pager">
+          <button className="btn btn-secondary" disabled={page.offset === 0} onClick={() => loadPage(Math.max(page.offset - pageSize, 0))}>
+            ◀ Previous
+          </button>
+          <span>
+            {(page.offset + 1).toLocaleString()}–{lastShown.toLocaleString()} of {page.total.toLocaleString()}
+          </span>
+          <button className="btn btn-secondary" disabled={lastShown >= page.total} onClick={() => loadPage(page.offset + pageSize)}>
+            Next ▶
+          </button>
+        </div>
+      )}
     </div>
   );
 }
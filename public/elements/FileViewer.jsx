@@ -0,0 +1,153 @@
+import React, { useState } from 'react';
+
+export default function FileViewer({ name = '', endpoint = '', size = '', lines = 0, pageLines = 200, firstPage = null }) {
+  const [page, setPage] = useState(firstPage);
+  const [loading, setLoading] = useState(false);
+  const [error, setError] = useState(null);
+  const [lineInput, setLineInput] = useState('');
+
+  // Fetch a single page from the server; only what the user navigates to is transferred
+  const loadPage = async (query) => {
+    setLoading(true);
+    setError(null);
+    try {
+      const response = await fetch(`${endpoint}?${new URLSearchParams(query)}`);
+      if (!response.ok) {
+        throw new Error(response.status === 404 ? 'This file is no longer available' : `Request failed (${response.status})`);
+      }
+      setPage(await response.json());
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  const goToLine = (event) => {
+    event.preventDefault();
+    const line = parseInt(lineInput, 10);
+    if (line > 0) {
+      loadPage({ line });
+    }
+  };
+
+  if (!page) {
+    return null;
+  }
+
+  const lastLine = page.end_line ?? Math.min(page.start_line + pageLines - 1, lines);
+
+  return (
+    <div className="file-viewer">
+      <style jsx>{`
+        .file-viewer {
+          display: flex;
+          flex-direction: column;
+          gap: 8px;
+          width: 100%;
+        }
+
+        .viewer-header {
+          display: flex;
+          justify-content: space-between;
+          align-items: center;
+          gap: 8px;
+          font-size: 13px;
+          color: var(--text-muted, #6b7280);
+        }
+
+        .viewer-title {
+          font-weight: 600;
+          color: var(--text-color, #1f2937);
+          overflow: hidden;
+          text-overflow: ellipsis;
+          white-space: nowrap;
+        }
+
+        .viewer-content {
+          margin: 0;
+          padding: 12px;
+          max-height: 60vh;
+          overflow: auto;
+          font-size: 12px;
+          line-height: 1.5;
+          white-space: pre;
+          background: var(--secondary-color, #f8fafc);
+          border: 1px solid var(--border-color, #e5e7eb);
+          border-radius: 8px;
+        }
+
+        [data-theme="dark"] .viewer-content {
+          background: rgba(17, 24, 39, 0.8);
+          border-color: var(--border-color, #374151);
+        }
+
+        .viewer-controls {
+          display: flex;
+          align-items: center;
+          gap: 8px;
+          font-size: 13px;
+        }
+
+        .viewer-btn {
+          padding: 4px 10px;
+          border-radius: 6px;
+          border: 1px solid var(--border-color, #e5e7eb);
+          background: var(--surface-color, white);
+          color: var(--text-color, #1f2937);
+          cursor: pointer;
+        }
+
+        .viewer-btn:disabled {
+          opacity: 0.5;
+          cursor: default;
+        }
+
+        .viewer-input {
+          width: 80px;
+          padding: 4px 8px;
+          border-radius: 6px;
+          border: 1px solid var(--border-color, #e5e7eb);
+          background: var(--background-color, white);
+          color: var(--text-color, #1f2937);
+        }
+
+        .viewer-error {
+          color: #dc2626;
+          font-size: 13px;
+        }
+      `}</style>
+
+      <div className="viewer-header">
+        <span className="viewer-title">{name}</span>
+        <span>{size} · {lines.toLocaleString()} lines</span>
+      </div>
+
+      <pre className="viewer-content">{page.text}{page.continues ? ' …' : ''}</pre>
+
+      <div className="viewer-controls">
+        <button className="viewer-btn" disabled={loading || page.page === 0} onClick={() => loadPage({ page: page.page - 1 })}>
+          ◀
+        </button>
+        <span>
+          Lines {page.start_line.toLocaleString()}–{lastLine.toLocaleString()} · page {page.page + 1} / {page.pages}
+        </span>
+        <button className="viewer-btn" disabled={loading || page.page >= page.pages - 1} onClick={() => loadPage({ page: page.page + 1 })}>
+          ▶
+        </button>
+        <form onSubmit={goToLine}>
+          <input
+            className="viewer-input"
+            type="number"
+            min="1"
+            placeholder="Line"
+            value={lineInput}
+            onChange={(e) => setLineInput(e.target.value)}
+          />
+        </form>
+      </div>
+
+      {error && <div className="viewer-error">{error}</div>}
+    </div>
+  );
+}
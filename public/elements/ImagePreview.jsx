@@ -0,0 +1,62 @@
+import React, { useState } from 'react';
+
+export default function ImagePreview({ name = '', thumbnail = '', preview = '', original = '', width = 0, height = 0 }) {
+  const [expanded, setExpanded] = useState(false);
+
+  return (
+    <div className="image-preview">
+      <style jsx>{`
+        .image-preview {
+          display: flex;
+          flex-direction: column;
+          gap: 6px;
+          width: 100%;
+        }
+
+        .preview-frame {
+          display: flex;
+          justify-content: center;
+          padding: 8px;
+          background: var(--secondary-color, #f8fafc);
+          border: 1px solid var(--border-color, #e5e7eb);
+          border-radius: 8px;
+          cursor: zoom-in;
+        }
+
+        [data-theme="dark"] .preview-frame {
+          background: rgba(17, 24, 39, 0.8);
+          border-color: var(--border-color, #374151);
+        }
+
+        .preview-frame img {
+          max-width: 100%;
+          max-height: 60vh;
+          border-radius: 4px;
+        }
+
+        .preview-meta {
+          display: flex;
+          justify-content: space-between;
+          gap: 8px;
+          font-size: 13px;
+          color: var(--text-muted, #6b7280);
+        }
+
+        .preview-meta a {
+          color: var(--primary-color, #2563eb);
+          text-decoration: none;
+        }
+      `}</style>
+
+      {/* Thumbnail first; the larger preview is only requested once expanded */}
+      <div className="preview-frame" onClick={() => setExpanded(!expanded)}>
+        <img src={expanded ? preview : thumbnail} alt={name} loading="lazy" />
+      </div>
+
+      <div className="preview-meta">
+        <span>{name} · {width}×{height}</span>
+        <a href={original} target="_blank" rel="noopener noreferrer">Open original</a>
+      </div>
+    </div>
+  );
+}
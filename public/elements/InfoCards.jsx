@@ -1,6 +1,6 @@
 import React from 'react';
 
-export default function InfoCards({ data = {} }) {
+export default function InfoCards({ data = {}, revealDelayMs = 0 }) {
   const {
     title = "Info Card",
     description = "Card displaying custom information",
@@ -11,9 +11,21 @@ export default function InfoCards({ data = {} }) {
   } = data;
 
   return (
-    <div className="info-card-container">
+    <div className="info-card-container" style={revealDelayMs ? { animationDelay: `${revealDelayMs}ms` } : undefined}>
       <style jsx>{`
+        @keyframes info-card-reveal {
+          from {
+            opacity: 0;
+            transform: translateY(8px);
+          }
+          to {
+            opacity: 1;
+            transform: none;
+          }
+        }
+
         .info-card-container {
+          animation: info-card-reveal 0.3s ease-out both;
           max-width: 600px;
           margin: 16px auto;
           background: var(--surface-color, white);
@@ -0,0 +1,142 @@
+import React, { useState } from 'react';
+
+export default function PdfPreview({ name = '', pages = 0, title = '', author = '', firstPage = '', pagesEndpoint = '', pageRange = 10, original = '' }) {
+  const [page, setPage] = useState(1);
+  const [urls, setUrls] = useState({ 1: firstPage });
+  const [loading, setLoading] = useState(false);
+  const [error, setError] = useState(null);
+
+  // Pages are rendered on the server in small batches; rendered pages are remembered here
+  const goToPage = async (target) => {
+    if (target < 1 || target > pages) {
+      return;
+    }
+    if (urls[target]) {
+      setPage(target);
+      return;
+    }
+    setLoading(true);
+    setError(null);
+    try {
+      const end = Math.min(target + Math.min(pageRange, 3) - 1, pages);
+      const response = await fetch(`${pagesEndpoint}?${new URLSearchParams({ start: target, end })}`);
+      if (!response.ok) {
+        throw new Error(response.status === 404 ? 'This document is no longer available' : `Request failed (${response.status})`);
+      }
+      const data = await response.json();
+      setUrls((current) => ({ ...current, ...data.urls }));
+      setPage(target);
+    } catch (err) {
+      setError(err.message);
+    } finally {
+      setLoading(false);
+    }
+  };
+
+  return (
+    <div className="pdf-preview">
+      <style jsx>{`
+        .pdf-preview {
+          display: flex;
+          flex-direction: column;
+          gap: 8px;
+          width: 100%;
+        }
+
+        .pdf-header {
+          display: flex;
+          flex-direction: column;
+          gap: 2px;
+          font-size: 13px;
+          color: var(--text-muted, #6b7280);
+        }
+
+        .pdf-title {
+          font-weight: 600;
+          color: var(--text-color, #1f2937);
+          overflow: hidden;
+          text-overflow: ellipsis;
+          white-space: nowrap;
+        }
+
+        .pdf-page {
+          display: flex;
+          justify-content: center;
+          padding: 8px;
+          max-height: 70vh;
+          overflow: auto;
+          background: var(--secondary-color, #f8fafc);
+          border: 1px solid var(--border-color, #e5e7eb);
+          border-radius: 8px;
+        }
+
+        [data-theme="dark"] .pdf-page {
+          background: rgba(17, 24, 39, 0.8);
+          border-color: var(--border-color, #374151);
+        }
+
+        .pdf-page img {
+          max-width: 100%;
+          background: white;
+          box-shadow: 0 1px 3px rgba(0, 0, 0, 0.15);
+        }
+
+        .pdf-controls {
+          display: flex;
+          align-items: center;
+          gap: 8px;
+          font-size: 13px;
+        }
+
+        .pdf-btn {
+          padding: 4px 10px;
+          border-radius: 6px;
+          border: 1px solid var(--border-color, #e5e7eb);
+          background: var(--surface-color, white);
+          color: var(--text-color, #1f2937);
+          cursor: pointer;
+        }
+
+        .pdf-btn:disabled {
+          opacity: 0.5;
+          cursor: default;
+        }
+
+        .pdf-controls a {
+          margin-left: auto;
+          color: var(--primary-color, #2563eb);
+          text-decoration: none;
+        }
+
+        .pdf-error {
+          color: #dc2626;
+          font-size: 13px;
+        }
+      `}</style>
+
+      <div className="pdf-header">
+        <span className="pdf-title">{title || name}</span>
+        {author && <span>{author}</span>}
+      </div>
+
+      <div className="pdf-page">
+        {urls[page] && <img src={urls[page]} alt={`${name} page ${page}`} />}
+      </div>
+
+      <div className="pdf-controls">
+        <button className="pdf-btn" disabled={loading || page <= 1} onClick={() => goToPage(page - 1)}>
+          ◀
+        </button>
+        <span>
+          Page {page} / {pages.toLocaleString()}
+        </span>
+        <button className="pdf-btn" disabled={loading || page >= pages} onClick={() => goToPage(page + 1)}>
+          ▶
+        </button>
+        <a href={original} target="_blank" rel="noopener noreferrer">Open document</a>
+      </div>
+
+      {error && <div className="pdf-error">{error}</div>}
+    </div>
+  );
+}
@@ -0,0 +1,29 @@
+from typing import Callable, Sequence
+
+from chainlit.config import config
+from chainlit.server import app
+from starlette.routing import Match
+
+
+def _first_match_index(path: str, method: str) -> int:
+    """Position of the first existing route that would already answer `path`"""
+    scope = {"type": "http", "path": path, "root_path": "", "method": method, "headers": []}
+    for index, route in enumerate(app.router.routes):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return index
+    return len(app.router.routes)
+
+
+def add_route(path: str, endpoint: Callable, methods: Sequence[str] = ("GET",), **kwargs):
+    """Register an HTTP endpoint on the Chainlit server
+
+    Routes added after Chainlit has built its app would be shadowed by the
+    catch-all route that serves the UI, so the new route is moved ahead of
+    whichever route currently answers its path.
+    """
+    full_path = config.run.root_path + path
+    probe = full_path.replace("{", "").replace("}", "").split(":")[0]
+    index = _first_match_index(probe, methods[0])
+    app.add_api_route(full_path, endpoint, methods=list(methods), **kwargs)
+    app.router.routes.insert(index, app.router.routes.pop())
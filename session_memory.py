@@ -0,0 +1,216 @@
+import asyncio
+import logging
+import os
+import sys
+from collections import Counter
+from typing import Dict, Any, List, Optional, Tuple
+
+from chainlit.chat_context import chat_contexts
+from chainlit.session import WebsocketSession, ws_sessions_id
+from chainlit.user_session import user_sessions
+from fastapi import Request
+from starlette.responses import JSONResponse
+
+from metrics import METRICS_PATH, authorized, unauthorized
+from server_routes import add_route
+from session_state import drop_sidebar, session_store, spill_sidebar
+
+logger = logging.getLogger(__name__)
+
+# Memory one session may retain before its sidebar text is spilled to disk, then its sidebar dropped, then its oldest messages
+SESSION_MEMORY_MAX_BYTES = int(os.environ.get("SESSION_MEMORY_MAX_KB", 2048)) * 1024
+SESSION_MEMORY_SWEEP_SECONDS = float(os.environ.get("SESSION_MEMORY_SWEEP_SECONDS", 30))
+# Sessions listed by the report endpoint unless ?top= says otherwise
+SESSION_MEMORY_TOP = int(os.environ.get("SESSION_MEMORY_TOP", 10))
+
+SESSION_MEMORY_PATH = METRICS_PATH.rstrip("/") + "/sessions"
+
+# Nesting deeper than this is not followed when estimating sizes
+_MAX_DEPTH = 8
+
+
+def deep_size(obj: Any, seen: Optional[set] = None, depth: int = 0) -> int:
+    """Approximate bytes retained by `obj` and everything it references
+
+    Objects reachable twice are counted once; modules, classes and
+    functions (shared code, not session data) are not counted. Containers
+    are copied before they are walked, so this can run off the event loop
+    while handlers change them.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen or depth > _MAX_DEPTH or isinstance(obj, (type, type(sys), type(deep_size))):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj, 0)
+    if isinstance(obj, dict):
+        size += sum(deep_size(key, seen, depth + 1) + deep_size(value, seen, depth + 1) for key, value in tuple(obj.items()))
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_size(item, seen, depth + 1) for item in tuple(obj))
+    elif hasattr(obj, "__dict__") and not isinstance(obj, (str, bytes)):
+        size += deep_size(vars(obj), seen, depth + 1)
+    return size
+
+
+def session_usage(session_id: str) -> Dict[str, int]:
+    """Bytes a session retains in this worker, by kind ("element:<type>" for sidebar elements)"""
+    # Everything is gathered before measuring: `seen` holds ids, which a freed temporary would hand on
+    roots: List[Tuple[str, Any]] = []
+    user_session = user_sessions.get(session_id)
+    if user_session:
+        # Chainlit copies these session fields in; they are counted with the session itself
+        roots.append(("user_session", {key: value for key, value in user_session.items() if key not in ("user", "env")}))
+    snapshot = session_store.cached(session_id)
+    if snapshot:
+        sidebar = snapshot.get("sidebar") or {}
+        roots += [(f"element:{spec['type']}", spec) for spec in sidebar.get("elements", [])]
+        roots.append(("snapshot", {key: value for key, value in snapshot.items() if key != "sidebar"}))
+    session = WebsocketSession.get_by_id(session_id)
+    if session is not None:
+        roots += [("files", session.files), ("chat_settings", session.chat_settings)]
+    # Every message sent or received in the session, kept by Chainlit for chat_context
+    messages = chat_contexts.get(session_id)
+    if messages:
+        roots.append(("messages", messages))
+    usage: Counter = Counter()
+    seen: set = set()
+    for kind, obj in roots:
+        usage[kind] += deep_size(obj, seen)
+    return dict(usage)
+
+
+class MemoryAccountant:
+    """Estimates what each session retains and keeps sessions under SESSION_MEMORY_MAX_BYTES
+
+    A session over the cap first has its sidebar text moved to disk (it is
+    read back if the sidebar is restored); if that is not enough its
+    recorded sidebar is dropped, then its oldest messages are dropped from
+    the chat context. Other session state belongs to the handlers that set
+    it, so it is only reported. Measuring walks every session's objects, so
+    it runs in a thread.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.totals: Dict[str, int] = {}
+        self.sessions: Dict[str, int] = {}
+        self.counters = {"spilled_bytes": 0, "spilled_sessions": 0, "dropped_sidebars": 0, "trimmed_messages": 0, "released_contexts": 0}
+        self._task: Optional[asyncio.Task] = None
+
+    def session_ids(self) -> set:
+        return {*user_sessions, *chat_contexts, *session_store.cached_ids(), *(session.id for session in list(ws_sessions_id.values()))}
+
+    def measure(self) -> Dict[str, Dict[str, int]]:
+        """Usage of every session this worker holds, refreshing the totals"""
+        usages = {session_id: session_usage(session_id) for session_id in self.session_ids()}
+        totals: Counter = Counter()
+        for usage in usages.values():
+            totals.update(usage)
+        self.totals = dict(totals)
+        self.sessions = {session_id: sum(usage.values()) for session_id, usage in usages.items()}
+        return usages
+
+    async def enforce(self, session_id: str, usage: Optional[Dict[str, int]] = None) -> int:
+        """Bring a session back under the cap; returns the bytes it now retains"""
+        usage = usage if usage is not None else await asyncio.to_thread(session_usage, session_id)
+        total = sum(usage.values())
+        if total <= self.max_bytes:
+            return total
+        freed = await spill_sidebar(session_id)
+        if freed:
+            self.counters["spilled_bytes"] += freed
+            self.counters["spilled_sessions"] += 1
+            usage = await asyncio.to_thread(session_usage, session_id)
+            total = sum(usage.values())
+        if total > self.max_bytes and any(kind.startswith("element:") for kind in usage):
+            logger.info("Dropping the recorded sidebar of session %s (%d bytes retained)", session_id[:8], total)
+            drop_sidebar(session_id)
+            self.counters["dropped_sidebars"] += 1
+            usage = await asyncio.to_thread(session_usage, session_id)
+            total = sum(usage.values())
+        if total > self.max_bytes and usage.get("messages"):
+            total -= self.trim_messages(session_id, total - self.max_bytes)
+        if total > self.max_bytes:
+            logger.warning("Session %s retains %d bytes outside its sidebar, over the %d byte cap", session_id[:8], total, self.max_bytes)
+        return total
+
+    def trim_messages(self, session_id: str, excess: int) -> int:
+        """Drop a session's oldest messages from its chat context until `excess` bytes are freed; returns the bytes freed"""
+        messages = chat_contexts.get(session_id) or []
+        freed = 0
+        # The latest message is kept: a handler may still be working on it
+        while freed < excess and len(messages) > 1:
+            freed += deep_size(messages.pop(0))
+            self.counters["trimmed_messages"] += 1
+        return freed
+
+    def release_contexts(self):
+        """Forget the chat context of sessions Chainlit has deleted; it never does so itself"""
+        for session_id in list(chat_contexts):
+            if session_id not in user_sessions and WebsocketSession.get_by_id(session_id) is None:
+                del chat_contexts[session_id]
+                self.counters["released_contexts"] += 1
+
+    async def sweep(self):
+        self.release_contexts()
+        for session_id, usage in (await asyncio.to_thread(self.measure)).items():
+            if sum(usage.values()) > self.max_bytes:
+                self.sessions[session_id] = await self.enforce(session_id, usage)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(SESSION_MEMORY_SWEEP_SECONDS)
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Session memory sweep failed")
+
+    def start(self):
+        """Start measuring and enforcing on the running loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def top(self, count: int) -> List[Dict[str, Any]]:
+        """The heaviest sessions, with session ids shortened so the report cannot be used to join them"""
+        usages = await asyncio.to_thread(self.measure)
+        heaviest = sorted(usages.items(), key=lambda item: sum(item[1].values()), reverse=True)[:count]
+        return [
+            {"session": session_id[:8], "bytes": sum(usage.values()), "by_kind": usage}
+            for session_id, usage in heaviest
+        ]
+
+    def stats(self) -> Dict[str, float]:
+        """Figures from the last measurement (sweep or report)"""
+        return {
+            "sessions": len(self.sessions),
+            "bytes": sum(self.sessions.values()),
+            "max_session_bytes": max(self.sessions.values(), default=0),
+            "over_cap_sessions": sum(1 for total in self.sessions.values() if total > self.max_bytes),
+            "session_max_bytes": self.max_bytes,
+            **{f"bytes:{kind}": value for kind, value in self.totals.items()},
+            **self.counters,
+        }
+
+
+memory_accountant = MemoryAccountant(SESSION_MEMORY_MAX_BYTES)
+
+
+async def session_memory_endpoint(request: Request, top: int = SESSION_MEMORY_TOP):
+    """The heaviest sessions and the worker's retained bytes by kind, for whoever may read /metrics"""
+    if not await authorized(request):
+        return unauthorized()
+    sessions = await memory_accountant.top(max(1, min(top, 1000)))
+    return JSONResponse({
+        "sessions": sessions,
+        "by_kind": memory_accountant.totals,
+        "total_bytes": sum(memory_accountant.sessions.values()),
+        "session_max_bytes": memory_accountant.max_bytes,
+    })
+
+
+add_route(SESSION_MEMORY_PATH, session_memory_endpoint, include_in_schema=False)
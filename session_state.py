@@ -0,0 +1,508 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+import chainlit as cl
+from chainlit.config import FILES_DIRECTORY, config
+from chainlit.element import Element
+from chainlit.session import ws_sessions_id
+
+from file_utils import write_atomically
+
+logger = logging.getLogger(__name__)
+
+# Where session snapshots live: "sqlite" (shared by every worker on the host) or "memory" (this worker only)
+SESSION_STATE_BACKEND = os.environ.get("SESSION_STATE_BACKEND", "sqlite")
+SESSION_STATE_DB = os.environ.get("SESSION_STATE_DB", "sessions.db")
+# Snapshots changed within this window are written together
+SESSION_STATE_FLUSH_MS = float(os.environ.get("SESSION_STATE_FLUSH_MS", 200))
+# Snapshots kept in this worker's read-through cache
+SESSION_STATE_CACHE_SIZE = int(os.environ.get("SESSION_STATE_CACHE_SIZE", 1024))
+# Snapshots larger than this are stored zlib-compressed
+SESSION_STATE_COMPRESS_BYTES = 1024
+# How often each worker reports the sessions it holds; a report older than three intervals has lapsed
+SESSION_PRESENCE_SECONDS = float(os.environ.get("SESSION_PRESENCE_SECONDS", 30))
+SESSION_PRESENCE_TTL = 3 * SESSION_PRESENCE_SECONDS
+# Sidebar text larger than this is kept in the session's upload directory instead of the snapshot
+ELEMENT_SPILL_BYTES = int(os.environ.get("ELEMENT_SPILL_BYTES", 16 * 1024))
+
+# Marks a cached snapshot holding only updates, not yet merged with the stored one
+PARTIAL = "__partial__"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_state (
+    id TEXT PRIMARY KEY,
+    snapshot BLOB NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS session_state_by_updated ON session_state (updated);
+CREATE TABLE IF NOT EXISTS session_handles (
+    token TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS session_handles_by_session ON session_handles (session_id);
+CREATE TABLE IF NOT EXISTS session_presence (
+    id TEXT PRIMARY KEY,
+    seen REAL NOT NULL
+);
+"""
+
+# Ids per query when looking up many sessions, well under SQLite's variable limit
+_ID_BATCH = 500
+
+
+def encode_snapshot(snapshot: Dict[str, Any]) -> bytes:
+    data = json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(data) > SESSION_STATE_COMPRESS_BYTES:
+        return b"z" + zlib.compress(data)
+    return b"j" + data
+
+
+def decode_snapshot(blob: bytes) -> Dict[str, Any]:
+    data = zlib.decompress(blob[1:]) if blob[:1] == b"z" else blob[1:]
+    return json.loads(data)
+
+
+class MemorySessionBackend:
+    """In-process stand-in for a shared key-value store"""
+
+    def __init__(self):
+        self._rows: Dict[str, Tuple[bytes, float]] = {}
+        self._handles: Dict[str, Tuple[str, bytes]] = {}
+        self._presence: Dict[str, float] = {}
+
+    def get(self, session_id: str) -> Optional[bytes]:
+        row = self._rows.get(session_id)
+        return row[0] if row else None
+
+    def put_many(self, rows: Iterable[Tuple[str, bytes, float]]):
+        for session_id, blob, updated in rows:
+            self._rows[session_id] = (blob, updated)
+
+    def delete(self, session_id: str):
+        self._rows.pop(session_id, None)
+
+    def get_handle(self, token: str) -> Optional[Tuple[str, bytes]]:
+        return self._handles.get(token)
+
+    def put_handles(self, rows: Iterable[Tuple[str, str, bytes]]):
+        for token, session_id, blob in rows:
+            self._handles[token] = (session_id, blob)
+
+    def set_presence(self, session_ids: Iterable[str], seen: float):
+        for session_id in session_ids:
+            self._presence[session_id] = seen
+            if session_id in self._rows:
+                blob, updated = self._rows[session_id]
+                self._rows[session_id] = (blob, max(updated, seen))
+
+    def present(self, session_ids: Iterable[str], since: float) -> set:
+        return {session_id for session_id in session_ids if self._presence.get(session_id, 0) >= since}
+
+    def last_updated(self, session_ids: Iterable[str]) -> Dict[str, float]:
+        return {session_id: self._rows[session_id][1] for session_id in session_ids if session_id in self._rows}
+
+    def expire(self, before: float) -> int:
+        expired = [session_id for session_id, (_, updated) in self._rows.items() if updated < before]
+        for session_id in expired:
+            del self._rows[session_id]
+        for token in [token for token, (session_id, _) in self._handles.items() if session_id not in self._rows]:
+            del self._handles[token]
+        for session_id in [session_id for session_id, seen in self._presence.items() if seen < before]:
+            del self._presence[session_id]
+        return len(expired)
+
+
+class SQLiteSessionBackend:
+    """Snapshots in a SQLite file, shared by the worker processes of one host"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+
+    def get(self, session_id: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._db.execute("SELECT snapshot FROM session_state WHERE id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, rows: Iterable[Tuple[str, bytes, float]]):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO session_state (id, snapshot, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET snapshot = excluded.snapshot, updated = excluded.updated",
+                list(rows),
+            )
+
+    def delete(self, session_id: str):
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM session_state WHERE id = ?", (session_id,))
+
+    def get_handle(self, token: str) -> Optional[Tuple[str, bytes]]:
+        with self._lock:
+            row = self._db.execute("SELECT session_id, data FROM session_handles WHERE token = ?", (token,)).fetchone()
+        return tuple(row) if row else None
+
+    def put_handles(self, rows: Iterable[Tuple[str, str, bytes]]):
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO session_handles (token, session_id, data) VALUES (?, ?, ?)", list(rows))
+
+    def set_presence(self, session_ids: Iterable[str], seen: float):
+        """Record sessions as held by a worker at `seen`, which also keeps their snapshots from expiring"""
+        rows = [(session_id, seen) for session_id in session_ids]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT INTO session_presence (id, seen) VALUES (?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET seen = MAX(seen, excluded.seen)",
+                rows,
+            )
+            self._db.executemany("UPDATE session_state SET updated = MAX(updated, ?) WHERE id = ?", [(seen, session_id) for session_id, seen in rows])
+
+    def _select_ids(self, query: str, session_ids: Iterable[str], *params) -> List[sqlite3.Row]:
+        session_ids = list(session_ids)
+        rows = []
+        with self._lock:
+            for start in range(0, len(session_ids), _ID_BATCH):
+                batch = session_ids[start:start + _ID_BATCH]
+                placeholders = ", ".join("?" * len(batch))
+                rows += self._db.execute(query.format(ids=placeholders), (*batch, *params)).fetchall()
+        return rows
+
+    def present(self, session_ids: Iterable[str], since: float) -> set:
+        return {row[0] for row in self._select_ids("SELECT id FROM session_presence WHERE id IN ({ids}) AND seen >= ?", session_ids, since)}
+
+    def last_updated(self, session_ids: Iterable[str]) -> Dict[str, float]:
+        return dict(self._select_ids("SELECT id, updated FROM session_state WHERE id IN ({ids})", session_ids))
+
+    def expire(self, before: float) -> int:
+        with self._lock, self._db:
+            expired = self._db.execute("DELETE FROM session_state WHERE updated < ?", (before,)).rowcount
+            self._db.execute("DELETE FROM session_handles WHERE session_id NOT IN (SELECT id FROM session_state)")
+            self._db.execute("DELETE FROM session_presence WHERE seen < ?", (before,))
+            return expired
+
+
+SESSION_BACKENDS = {
+    "memory": lambda: MemorySessionBackend(),
+    "sqlite": lambda: SQLiteSessionBackend(SESSION_STATE_DB),
+}
+
+
+class SessionStore:
+    """Per-session snapshots kept in a backend shared across workers
+
+    Reads go through an LRU cache; updates are merged into the cached
+    snapshot and written behind in batches, so handlers never wait on the
+    backend to record state. A reconnect that lands on another worker reads
+    the snapshot back and restores the session from it.
+
+    The backend also holds handles (tokens the UI fetches files by, such as
+    viewer ids, which any worker must be able to resolve) and a presence
+    heartbeat telling every worker which sessions are held somewhere.
+    """
+
+    def __init__(self, backend, cache_size: int):
+        self.backend = backend
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._dirty: Dict[str, float] = {}
+        # token -> (session id, data), not yet written
+        self._handles: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"hits": 0, "misses": 0, "writes": 0, "flushes": 0, "expired": 0, "refused": 0}
+
+    def _remember(self, session_id: str, snapshot: Dict[str, Any]):
+        self._cache[session_id] = snapshot
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.cache_size:
+            oldest = next(iter(self._cache))
+            if oldest in self._dirty:
+                # Not written yet; keep it until the next flush
+                self._cache.move_to_end(oldest)
+                break
+            del self._cache[oldest]
+
+    async def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        snapshot = self._cache.get(session_id)
+        if snapshot is not None and PARTIAL not in snapshot:
+            self._cache.move_to_end(session_id)
+            self.counters["hits"] += 1
+            return snapshot
+        self.counters["misses"] += 1
+        blob = await asyncio.to_thread(self.backend.get, session_id)
+        if blob is None and snapshot is None:
+            return None
+        stored = decode_snapshot(blob) if blob else {}
+        if snapshot is not None:
+            # Updates made while the snapshot was out of the cache win over the stored copy
+            stored.update(snapshot)
+            stored.pop(PARTIAL)
+            snapshot.clear()
+            snapshot.update(stored)
+        self._remember(session_id, stored if snapshot is None else snapshot)
+        return self._cache[session_id]
+
+    def update(self, session_id: str, **fields):
+        """Merge fields into a session's snapshot and schedule it to be written"""
+        snapshot = self._cache.get(session_id)
+        if snapshot is None:
+            # Merged with the stored snapshot when written
+            snapshot = {PARTIAL: True}
+        snapshot.update(fields)
+        self._remember(session_id, snapshot)
+        self._dirty[session_id] = time.time()
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_later())
+
+    def put_handle(self, token: str, session_id: str, data: Dict[str, Any]):
+        """Make `token` resolvable to `data` on every worker until the session expires"""
+        self._handles[token] = (session_id, data)
+        self._schedule_flush()
+
+    async def handle(self, token: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(session id, data) a token was registered with, by any worker"""
+        pending = self._handles.get(token)
+        if pending is not None:
+            return pending
+        row = await asyncio.to_thread(self.backend.get_handle, token)
+        return (row[0], decode_snapshot(row[1])) if row else None
+
+    async def present(self, session_ids: Iterable[str]) -> set:
+        """Those of `session_ids` some worker currently holds"""
+        return await asyncio.to_thread(self.backend.present, list(session_ids), time.time() - SESSION_PRESENCE_TTL)
+
+    async def last_updated(self, session_ids: Iterable[str]) -> Dict[str, float]:
+        """When each session's snapshot was last written or touched, by any worker"""
+        session_ids = list(session_ids)
+        updated = await asyncio.to_thread(self.backend.last_updated, session_ids)
+        for session_id in session_ids:
+            if session_id in self._dirty:
+                updated[session_id] = max(updated.get(session_id, 0), self._dirty[session_id])
+        return updated
+
+    async def drop(self, session_id: str):
+        """Delete a session's snapshot here and in the backend"""
+        self._cache.pop(session_id, None)
+        self._dirty.pop(session_id, None)
+        await asyncio.to_thread(self.backend.delete, session_id)
+
+    def cached(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """A session's snapshot as held in this worker's cache, without reading the backend"""
+        return self._cache.get(session_id)
+
+    def cached_ids(self) -> List[str]:
+        return list(self._cache)
+
+    def touch(self, session_id: str):
+        """Keep a session's snapshot from expiring, e.g. when its socket disconnects"""
+        self.update(session_id)
+
+    async def _flush_later(self):
+        await asyncio.sleep(SESSION_STATE_FLUSH_MS / 1000)
+        await self.flush()
+
+    async def flush(self):
+        """Write every pending snapshot and handle in one batch"""
+        if not self._dirty and not self._handles:
+            return
+        dirty, self._dirty = self._dirty, {}
+        handles, self._handles = self._handles, {}
+        items = [(session_id, dict(self._cache.get(session_id, {})), updated) for session_id, updated in dirty.items()]
+        try:
+            await asyncio.to_thread(self._write, items, handles)
+        except Exception:
+            logger.exception("Writing %d session snapshots failed", len(items))
+            for session_id, updated in dirty.items():
+                self._dirty.setdefault(session_id, updated)
+            for token, handle in handles.items():
+                self._handles.setdefault(token, handle)
+            return
+        for session_id, snapshot, _ in items:
+            # Partial snapshots are complete in the backend now; read them back from there
+            if PARTIAL in snapshot and session_id not in self._dirty:
+                self._cache.pop(session_id, None)
+        self.counters["writes"] += len(items)
+        self.counters["flushes"] += 1
+
+    def _write(self, items: List[Tuple[str, Dict[str, Any], float]], handles: Dict[str, Tuple[str, Dict[str, Any]]]):
+        rows = []
+        for session_id, snapshot, updated in items:
+            if PARTIAL in snapshot:
+                blob = self.backend.get(session_id)
+                snapshot = {**(decode_snapshot(blob) if blob else {}), **snapshot}
+                del snapshot[PARTIAL]
+            rows.append((session_id, encode_snapshot(snapshot), updated))
+        if rows:
+            self.backend.put_many(rows)
+        if handles:
+            self.backend.put_handles([(token, session_id, encode_snapshot(data)) for token, (session_id, data) in handles.items()])
+
+    async def _run(self):
+        expired_at = time.monotonic()
+        while True:
+            await asyncio.sleep(SESSION_PRESENCE_SECONDS)
+            try:
+                # Sessions this worker holds, connected or waiting out their timeout
+                held = [session.id for session in list(ws_sessions_id.values())]
+                await asyncio.to_thread(self.backend.set_presence, held, time.time())
+                if time.monotonic() - expired_at >= 60:
+                    expired_at = time.monotonic()
+                    before = time.time() - config.project.session_timeout
+                    self.counters["expired"] += await asyncio.to_thread(self.backend.expire, before)
+            except Exception:
+                logger.exception("Session presence or expiry failed")
+
+    def start(self):
+        """Start reporting this worker's sessions and expiring snapshots older than the session timeout"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, float]:
+        return {"cached": len(self._cache), "pending": len(self._dirty), "pending_handles": len(self._handles), **self.counters}
+
+
+session_store = SessionStore(SESSION_BACKENDS[SESSION_STATE_BACKEND](), SESSION_STATE_CACHE_SIZE)
+
+
+def _write_spill(session_id: str, content: str) -> str:
+    """Store text under its content hash in the session's upload directory, so it is evicted with the uploads"""
+    data = content.encode("utf-8")
+    directory = os.path.join(str(FILES_DIRECTORY), session_id)
+    path = os.path.join(directory, f"spill-{hashlib.sha256(data).hexdigest()[:32]}.txt")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        write_atomically(path, data)
+    return path
+
+
+def _read_spill(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+async def _spill(session_id: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+    """A text spec with its content moved to disk"""
+    path = await asyncio.to_thread(_write_spill, session_id, spec["content"])
+    return {"type": "text", "name": spec["name"], "spilled": path}
+
+
+def element_snapshot(element: Element) -> Optional[Dict[str, Any]]:
+    """What it takes to send a sidebar element again, without the work that produced it"""
+    if isinstance(element, cl.CustomElement):
+        # Viewer ids and original tokens in the props resolve on any worker through the store's handles
+        return {"type": "custom", "name": element.name, "props": element.props}
+    if isinstance(element, cl.Text):
+        return {"type": "text", "name": element.name, "content": element.content}
+    if element.path:
+        return {"type": element.type, "name": element.name, "path": element.path}
+    return None
+
+
+def restore_element(spec: Dict[str, Any]) -> Optional[Element]:
+    if spec["type"] == "custom":
+        return cl.CustomElement(name=spec["name"], props=spec["props"])
+    if spec["type"] == "text":
+        content = spec["content"] if "content" in spec else _read_spill(spec["spilled"])
+        return cl.Text(name=spec["name"], content=content) if content is not None else None
+    if not os.path.exists(spec["path"]):
+        # Stored on another node's disk
+        return None
+    element_class = {"image": cl.Image, "pdf": cl.Pdf}.get(spec["type"], cl.File)
+    return element_class(name=spec["name"], path=spec["path"])
+
+
+def text_bytes(spec: Dict[str, Any]) -> int:
+    """Bytes of text a sidebar spec keeps in memory"""
+    content = spec.get("content")
+    return len(content.encode("utf-8")) if content else 0
+
+
+async def record_sidebar(title: str, elements: List[Element]):
+    """Remember the current session's sidebar so another worker can show it again"""
+    session_id = cl.context.session.id
+    specs = [spec for spec in (element_snapshot(element) for element in elements) if spec]
+    specs = [await _spill(session_id, spec) if text_bytes(spec) > ELEMENT_SPILL_BYTES else spec for spec in specs]
+    session_store.update(session_id, sidebar={"title": title, "elements": specs})
+
+
+async def spill_sidebar(session_id: str) -> int:
+    """Move all of a cached sidebar's text to disk, returning the bytes freed
+
+    Snapshots are replaced rather than modified, since a write-behind
+    flush may be encoding the current one.
+    """
+    snapshot = session_store.cached(session_id)
+    sidebar = snapshot.get("sidebar") if snapshot else None
+    freed = sum(text_bytes(spec) for spec in sidebar["elements"]) if sidebar else 0
+    if freed:
+        specs = [await _spill(session_id, spec) if text_bytes(spec) else spec for spec in sidebar["elements"]]
+        session_store.update(session_id, sidebar={**sidebar, "elements": specs})
+    return freed
+
+
+def drop_sidebar(session_id: str):
+    """Forget a session's sidebar; a reconnect elsewhere then starts with an empty one"""
+    if session_store.cached(session_id) is not None:
+        session_store.update(session_id, sidebar=None)
+
+
+async def restore_session() -> Optional[Dict[str, Any]]:
+    """Restore the current session from its snapshot, if another worker left one
+
+    The chat profile and settings are put back on the session; the snapshot
+    is returned so the caller can decide what the client still needs. A
+    snapshot recorded for another user is never restored: like Chainlit's
+    own reconnect check, the session id alone does not prove ownership.
+    """
+    session = cl.context.session
+    owner = session.user.identifier if session.user else None
+    snapshot = await session_store.get(session.id)
+    if snapshot and snapshot.get("owner") != owner:
+        logger.warning("Refusing to restore session %s for a user other than its owner", session.id[:8])
+        session_store.counters["refused"] += 1
+        await session_store.drop(session.id)
+        snapshot = None
+    if not snapshot:
+        session_store.update(session.id, chat_profile=session.chat_profile, owner=owner)
+        return None
+
+    if not session.chat_profile and snapshot.get("chat_profile"):
+        session.chat_profile = snapshot["chat_profile"]
+    if snapshot.get("config_settings") is not None:
+        session.chat_settings = snapshot["config_settings"]
+        cl.user_session.set("config_settings", snapshot["config_settings"])
+    return snapshot
+
+
+async def send_sidebar(snapshot: Optional[Dict[str, Any]]):
+    """Send the sidebar recorded in a snapshot, or an empty one"""
+    sidebar = snapshot.get("sidebar") if snapshot else None
+    restored = await asyncio.to_thread(lambda: [restore_element(spec) for spec in sidebar["elements"]]) if sidebar else []
+    elements = [element for element in restored if element]
+    await cl.ElementSidebar.set_elements(elements)
+    if elements:
+        await cl.ElementSidebar.set_title(sidebar["title"])
@@ -0,0 +1,139 @@
+import codecs
+import os
+from typing import Dict, Any, Optional
+
+# Only this much of an upload is read to decide how to handle it
+SNIFF_BYTES = int(os.environ.get("UPLOAD_SNIFF_BYTES", 8 * 1024))
+
+# (offset, magic bytes, MIME type), checked in order
+MAGIC_SIGNATURES = (
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+    (0, b"\x00\x00\x01\x00", "image/x-icon"),
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"PK\x03\x04", "application/zip"),
+    (0, b"\x1f\x8b", "application/gzip"),
+    (0, b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (0, b"Rar!\x1a\x07", "application/vnd.rar"),
+    (0, b"\x7fELF", "application/x-executable"),
+    (0, b"OggS", "audio/ogg"),
+    (0, b"fLaC", "audio/flac"),
+    (0, b"SQLite format 3\x00", "application/vnd.sqlite3"),
+)
+
+# Short signatures that plain text may start with; only trusted for binary content
+WEAK_SIGNATURES = (
+    (0, b"BM", "image/bmp"),
+    (0, b"MZ", "application/x-msdownload"),
+    (0, b"ID3", "audio/mpeg"),
+)
+
+# Container formats identified by a sub-type tag: RIFF (at offset 8) and ISO BMFF "ftyp" brands
+RIFF_TYPES = {b"WEBP": "image/webp", b"WAVE": "audio/wav", b"AVI ": "video/x-msvideo"}
+FTYP_BRANDS = {b"avif": "image/avif", b"heic": "image/heic", b"heix": "image/heic", b"mif1": "image/heif", b"qt  ": "video/quicktime"}
+
+# Byte order marks of text encodings
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Text encodings in which b"\n" is always a line break, so the streaming preview can handle them
+ASCII_COMPATIBLE = {"utf-8", "utf-8-sig", "latin-1"}
+
+# Declared types that get decoded are only trusted when their signature matches
+DECODED_PREFIXES = ("image/", "application/pdf")
+
+# Control bytes other than tab, line feeds, form feed and escape mark content as binary
+_CONTROL_BYTES = bytes(set(range(32)) - {9, 10, 12, 13, 27})
+
+
+def match_magic(head: bytes) -> Optional[str]:
+    """MIME type announced by a file's leading bytes, if it has a known signature"""
+    for offset, magic, mime in MAGIC_SIGNATURES:
+        if head.startswith(magic, offset):
+            return mime
+    if head.startswith(b"RIFF") and head[8:12] in RIFF_TYPES:
+        return RIFF_TYPES[head[8:12]]
+    if head[4:8] == b"ftyp":
+        return FTYP_BRANDS.get(head[8:12], "video/mp4")
+    return None
+
+
+def has_padded_pdf_header(head: bytes) -> bool:
+    """A PDF header after a byte order mark or leading whitespace, which PDF readers still accept"""
+    if head.startswith(codecs.BOM_UTF8):
+        head = head[len(codecs.BOM_UTF8):]
+    return head[:1024].lstrip().startswith(b"%PDF-")
+
+
+def detect_encoding(head: bytes) -> Optional[str]:
+    """Text encoding of a file header, or None if it looks binary"""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding
+    if b"\x00" in head:
+        return None
+    try:
+        # Not final: the header may end in the middle of a multi-byte character
+        codecs.getincrementaldecoder("utf-8")().decode(head)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    if len(head.translate(None, _CONTROL_BYTES)) < len(head) * 0.9:
+        return None
+    return "latin-1"
+
+
+def _is_text_mime(mime: Optional[str]) -> bool:
+    return bool(mime) and (mime.startswith("text/") or "json" in mime or "xml" in mime)
+
+
+def _is_opaque_mime(mime: Optional[str]) -> bool:
+    """A binary type we pass through without decoding"""
+    return bool(mime) and not _is_text_mime(mime) and not mime.startswith(DECODED_PREFIXES)
+
+
+def sniff_upload(path: str, declared_mime: Optional[str]) -> Dict[str, Any]:
+    """Identify an upload from its first SNIFF_BYTES bytes
+
+    Returns the MIME type to route on, the text encoding (None for binary
+    content) and whether the declared type was overridden.
+    """
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_BYTES)
+
+    mime = match_magic(head)
+    # A padded header is a weaker sign than one at offset 0: it doesn't override a declared text type
+    if mime is None and not _is_text_mime(declared_mime) and has_padded_pdf_header(head):
+        mime = "application/pdf"
+    encoding = None
+    if mime is None and head:
+        encoding = detect_encoding(head)
+        if encoding is None:
+            # Binary without a strong signature: keep a declared opaque type, never a text or image one
+            mime = next(
+                (found for offset, magic, found in WEAK_SIGNATURES if head.startswith(magic, offset)),
+                declared_mime if _is_opaque_mime(declared_mime) else "application/octet-stream",
+            )
+        elif _is_text_mime(declared_mime):
+            mime = declared_mime
+        else:
+            mime = "application/json" if head.lstrip()[:1] in (b"{", b"[") else "text/plain"
+    elif mime is None:
+        mime = declared_mime or "application/octet-stream"
+        # An empty file decodes as anything; keep declared text on the text path
+        encoding = "utf-8" if _is_text_mime(mime) else None
+
+    return {
+        "mime": mime,
+        "encoding": encoding,
+        "sniffed": mime != declared_mime,
+    }
@@ -0,0 +1,250 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from chainlit.config import FILES_DIRECTORY, config
+from chainlit.server import UserParam, upload_file
+from chainlit.session import WebsocketSession
+from fastapi import Request
+from starlette.datastructures import UploadFile
+from starlette.responses import JSONResponse
+
+from server_routes import add_route
+from session_state import session_store
+
+logger = logging.getLogger(__name__)
+
+# Disk quotas for uploaded files, per session and across all sessions
+SPOOL_SESSION_MAX_BYTES = int(os.environ.get("SPOOL_SESSION_MAX_MB", 1024)) * 1024 * 1024
+SPOOL_MAX_BYTES = int(os.environ.get("SPOOL_MAX_MB", 10 * 1024)) * 1024 * 1024
+# How often the background sweep rescans the spool and evicts
+SPOOL_SWEEP_SECONDS = float(os.environ.get("SPOOL_SWEEP_SECONDS", 60))
+# Seconds after retrying a rejected upload may succeed, sent as Retry-After
+SPOOL_RETRY_AFTER = int(os.environ.get("SPOOL_RETRY_AFTER", 30))
+
+UPLOAD_PATH = "/project/file"
+
+
+def _dir_usage(path: str) -> Tuple[int, int, float]:
+    """Bytes, file count and latest mtime of a session's upload directory"""
+    size = files = 0
+    latest = 0.0
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return 0, 0, 0.0
+    for entry in entries:
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        if entry.is_file(follow_symlinks=False):
+            size += stat.st_size
+            files += 1
+        latest = max(latest, stat.st_mtime)
+    return size, files, latest
+
+
+class UploadSpool:
+    """Tracks the disk used by uploaded files and enforces quotas
+
+    Chainlit stores each session's uploads in FILES_DIRECTORY/<session id>.
+    Usage is re-measured after every upload and on a periodic sweep; bytes of
+    uploads still in flight are reserved up front so concurrent uploads cannot
+    overshoot a quota together. Workers share the directory, so the sweep
+    asks the session store whether a session is held by any of them before
+    evicting its uploads.
+    """
+
+    def __init__(self, root: str, max_bytes: int, session_max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.session_max_bytes = session_max_bytes
+        # session id -> {"bytes", "files", "reserved", "ended"}
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.counters = {"rejected_session_quota": 0, "rejected_global_quota": 0, "evicted_sessions": 0, "evicted_bytes": 0}
+        # Size of the largest upload turned away for lack of space since the last sweep
+        self._needed = 0
+        self._task: Optional[asyncio.Task] = None
+        self._sweep_lock = asyncio.Lock()
+        self._evict_callbacks: List[Callable[[str], None]] = []
+
+    def _entry(self, session_id: str) -> Dict[str, Any]:
+        entry = self.sessions.get(session_id)
+        if entry is None:
+            entry = self.sessions[session_id] = {"bytes": 0, "files": 0, "reserved": 0, "ended": None}
+        return entry
+
+    def usage(self) -> int:
+        return sum(entry["bytes"] + entry["reserved"] for entry in self.sessions.values())
+
+    def admit(self, session_id: str, size: int) -> Optional[Tuple[int, str]]:
+        """Reserve room for an upload, or return (status code, reason) to reject it"""
+        entry = self._entry(session_id)
+        if entry["bytes"] + entry["reserved"] + size > self.session_max_bytes:
+            self.counters["rejected_session_quota"] += 1
+            return 413, "Upload quota for this chat exceeded; remove files or start a new chat"
+        if self.usage() + size > self.max_bytes:
+            self.counters["rejected_global_quota"] += 1
+            self._needed = max(self._needed, size)
+            # Free space for the next attempt without holding up this request
+            self.start_sweep()
+            return 503, "Upload storage is full, please retry shortly"
+        entry["reserved"] += size
+        # The session is in use again (e.g. resumed after a disconnect)
+        entry["ended"] = None
+        return None
+
+    async def release(self, session_id: str, size: int):
+        """Drop an upload's reservation and re-measure the session's usage"""
+        entry = self._entry(session_id)
+        entry["reserved"] = max(0, entry["reserved"] - size)
+        await self.measure(session_id)
+
+    async def measure(self, session_id: str):
+        entry = self._entry(session_id)
+        entry["bytes"], entry["files"], _ = await asyncio.to_thread(_dir_usage, os.path.join(self.root, session_id))
+
+    def end_session(self, session_id: str):
+        """Mark a session's uploads as evictable once it ends"""
+        if session_id in self.sessions:
+            self.sessions[session_id]["ended"] = time.time()
+
+    def on_evict(self, callback: Callable[[str], None]):
+        """Call `callback(session_id)` once a session's uploads are gone, to release what refers to them"""
+        self._evict_callbacks.append(callback)
+
+    def _evicted(self, session_id: str):
+        for callback in self._evict_callbacks:
+            try:
+                callback(session_id)
+            except Exception:
+                logger.exception("Eviction callback failed for session %s", session_id)
+
+    async def _evict(self, session_id: str):
+        entry = self.sessions.pop(session_id, None)
+        await asyncio.to_thread(shutil.rmtree, os.path.join(self.root, session_id), True)
+        self.counters["evicted_sessions"] += 1
+        self.counters["evicted_bytes"] += entry["bytes"] if entry else 0
+        self._evicted(session_id)
+
+    async def sweep(self):
+        """Re-measure the spool, evict expired uploads, then ended sessions while short of space"""
+        async with self._sweep_lock:
+            now = time.time()
+            timeout = config.project.session_timeout
+            try:
+                names = await asyncio.to_thread(os.listdir, self.root)
+            except OSError:
+                names = []
+            # Dot directories hold derived data with disk budgets of their own (previews.py, upload_cache.py)
+            names = [name for name in names if not name.startswith(".") and os.path.isdir(os.path.join(self.root, name))]
+            elsewhere = [name for name in names if WebsocketSession.get_by_id(name) is None]
+            try:
+                held = await session_store.present(elsewhere)
+                updated = await session_store.last_updated(elsewhere)
+            except Exception:
+                logger.exception("Could not read session presence; skipping eviction")
+                held, updated = set(elsewhere), {}
+            for name in names:
+                entry = self._entry(name)
+                entry["bytes"], entry["files"], latest = await asyncio.to_thread(_dir_usage, os.path.join(self.root, name))
+                if WebsocketSession.get_by_id(name) is not None:
+                    continue
+                if name in held:
+                    # Live on another worker
+                    entry["ended"] = None
+                    continue
+                # Last activity any worker recorded, or the uploads themselves if it left no trace (e.g. a restart)
+                entry["ended"] = max(entry["ended"] or 0, updated.get(name, 0)) or latest or now
+                if now - entry["ended"] > timeout:
+                    await self._evict(name)
+            for name in [name for name in self.sessions if name not in names and not self.sessions[name]["reserved"]]:
+                # Evicted by another worker, or by Chainlit once the session timed out
+                if self.sessions.pop(name)["ended"] is not None:
+                    self._evicted(name)
+
+            # Make room for the uploads that were turned away, too
+            target = self.max_bytes - self._needed
+            self._needed = 0
+            if self.usage() > target:
+                ended = sorted((entry["ended"], name) for name, entry in self.sessions.items() if entry["ended"] is not None)
+                for _, name in ended:
+                    if self.usage() <= target:
+                        break
+                    logger.info("Evicting uploads of ended session %s to stay under the spool quota", name)
+                    await self._evict(name)
+
+    def start_sweep(self):
+        if not self._sweep_lock.locked():
+            asyncio.get_running_loop().create_task(self.sweep())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                logger.exception("Upload spool sweep failed")
+            await asyncio.sleep(SPOOL_SWEEP_SECONDS)
+
+    def start(self):
+        """Start the background sweep on the running loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "bytes": sum(entry["bytes"] for entry in self.sessions.values()),
+            "reserved_bytes": sum(entry["reserved"] for entry in self.sessions.values()),
+            "files": sum(entry["files"] for entry in self.sessions.values()),
+            "sessions": len(self.sessions),
+            "max_bytes": self.max_bytes,
+            "session_max_bytes": self.session_max_bytes,
+            **self.counters,
+        }
+
+
+upload_spool = UploadSpool(str(FILES_DIRECTORY), SPOOL_MAX_BYTES, SPOOL_SESSION_MAX_BYTES)
+
+
+async def spool_upload_endpoint(request: Request, current_user: UserParam, session_id: str, ask_parent_id: Optional[str] = None):
+    """Admission check in front of Chainlit's upload endpoint
+
+    The request body is not read until the upload has been admitted, so an
+    upload over quota is turned away before it costs any disk or memory.
+    """
+    # The quota is checked against the declared length, which the HTTP server holds the body to
+    try:
+        size = int(request.headers["content-length"])
+    except (KeyError, ValueError):
+        size = -1
+    if size < 0:
+        return JSONResponse({"detail": "Uploads must declare their Content-Length"}, status_code=411)
+    rejection = upload_spool.admit(session_id, size)
+    if rejection:
+        status_code, reason = rejection
+        headers = {"Retry-After": str(SPOOL_RETRY_AFTER)} if status_code == 503 else None
+        return JSONResponse({"detail": reason}, status_code=status_code, headers=headers)
+
+    try:
+        form = await request.form(max_files=1)
+        try:
+            file = form.get("file")
+            if not isinstance(file, UploadFile):
+                return JSONResponse({"detail": "No file in upload"}, status_code=422)
+            return await upload_file(current_user, session_id, file, ask_parent_id)
+        finally:
+            await form.close()
+    finally:
+        await upload_spool.release(session_id, size)
+
+
+add_route(UPLOAD_PATH, spool_upload_endpoint, methods=("POST",), include_in_schema=False)
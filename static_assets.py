@@ -0,0 +1,191 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+from typing import Dict, Any, Optional
+
+from chainlit.config import APP_ROOT, config
+from chainlit.server import serve_public_file
+from fastapi import HTTPException, Request
+from starlette.responses import FileResponse, Response
+
+from file_utils import write_atomically
+from server_routes import add_route
+
+try:
+    import brotli
+except ImportError:  # optional (see the "assets" extra); gzip variants are still built
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+PUBLIC_DIR = os.path.join(APP_ROOT, "public")
+ASSETS_DIR = os.environ.get("ASSETS_DIR", os.path.join(APP_ROOT, ".assets"))
+# Files under public/ that get fingerprinted and precompressed
+ASSET_EXTENSIONS = {".css": "text/css", ".js": "text/javascript", ".jsx": "text/javascript", ".svg": "image/svg+xml"}
+# Smaller files are not worth a compressed variant
+COMPRESS_MIN_BYTES = 1024
+
+STATIC_PATH = "/static"
+PUBLIC_PATH = "/public"
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Unhashed URLs (custom elements are fetched by name) are revalidated against the ETag
+REVALIDATE = "no-cache"
+
+MANIFEST_NAME = "manifest.json"
+# Precompressed variants in order of preference, and their file suffixes
+ENCODING_SUFFIXES = {"br": "br", "gzip": "gz"}
+
+
+def _variants(data: bytes) -> Dict[str, bytes]:
+    """Precompressed encodings of `data` that actually save bytes"""
+    if len(data) < COMPRESS_MIN_BYTES:
+        return {}
+    variants = {"gzip": gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data) * 0.9}
+
+
+def build_assets(public_dir: str = PUBLIC_DIR, out_dir: str = ASSETS_DIR) -> Dict[str, Dict[str, Any]]:
+    """Fingerprint and precompress the public assets, returning the manifest
+
+    Each source is written to out_dir as <name>.<hash><ext> with .gz/.br
+    siblings. Outputs that already exist are reused, so rebuilding an
+    unchanged tree only hashes it; outputs no longer referenced are removed.
+    """
+    manifest: Dict[str, Dict[str, Any]] = {}
+    for directory, dirnames, filenames in os.walk(public_dir):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith("."))
+        for filename in sorted(filenames):
+            stem, ext = os.path.splitext(filename)
+            if ext not in ASSET_EXTENSIONS:
+                continue
+            source = os.path.join(directory, filename)
+            logical = os.path.relpath(source, public_dir).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:16]
+            hashed = os.path.join(os.path.dirname(logical), f"{stem}.{digest}{ext}").replace(os.sep, "/").lstrip("/")
+            target = os.path.join(out_dir, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            encodings = {}
+            if not os.path.exists(target):
+                write_atomically(target, data)
+                for encoding, body in _variants(data).items():
+                    write_atomically(f"{target}.{ENCODING_SUFFIXES[encoding]}", body)
+            for encoding, suffix in ENCODING_SUFFIXES.items():
+                if os.path.exists(f"{target}.{suffix}"):
+                    encodings[encoding] = f"{hashed}.{suffix}"
+            manifest[logical] = {
+                "path": hashed,
+                "etag": f'"{digest}"',
+                "media_type": ASSET_EXTENSIONS[ext],
+                "size": len(data),
+                "encodings": encodings,
+            }
+
+    keep = {MANIFEST_NAME}
+    for entry in manifest.values():
+        keep.add(entry["path"])
+        keep.update(entry["encodings"].values())
+    for directory, _, filenames in os.walk(out_dir):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            # .tmp files may be another worker's build in progress
+            if not filename.endswith(".tmp") and os.path.relpath(path, out_dir).replace(os.sep, "/") not in keep:
+                os.unlink(path)
+
+    write_atomically(os.path.join(out_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    return manifest
+
+
+def _accepted_encodings(request: Request) -> set:
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.partition(";")
+        key, _, value = params.partition("=")
+        try:
+            if key.strip() == "q" and float(value) == 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class AssetServer:
+    """Serves the built assets with ETags and their precompressed variants"""
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+        self.by_hashed_path: Dict[str, Dict[str, Any]] = {}
+
+    def load(self, manifest: Dict[str, Dict[str, Any]]):
+        self.manifest = manifest
+        self.by_hashed_path = {entry["path"]: entry for entry in manifest.values()}
+
+    def url(self, logical: str) -> Optional[str]:
+        """Fingerprinted URL of a public/ file, if it was built"""
+        entry = self.manifest.get(logical)
+        return config.run.root_path + f"{STATIC_PATH}/{entry['path']}" if entry else None
+
+    def respond(self, request: Request, entry: Dict[str, Any], cache_control: str) -> Response:
+        headers = {"Cache-Control": cache_control, "ETag": entry["etag"], "Vary": "Accept-Encoding"}
+        if entry["etag"] in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+        path = entry["path"]
+        accepted = _accepted_encodings(request)
+        for encoding in ENCODING_SUFFIXES:
+            if encoding in accepted and encoding in entry["encodings"]:
+                path = entry["encodings"][encoding]
+                headers["Content-Encoding"] = encoding
+                break
+        return FileResponse(os.path.join(self.out_dir, path), media_type=entry["media_type"], headers=headers)
+
+
+asset_server = AssetServer(ASSETS_DIR)
+
+
+def install_assets():
+    """Build the assets, point the configured custom CSS/JS at their fingerprinted URLs"""
+    try:
+        asset_server.load(build_assets())
+    except OSError:
+        logger.exception("Building static assets failed; serving public/ as is")
+        return
+    for attribute in ("custom_css", "custom_js"):
+        reference = getattr(config.ui, attribute, None)
+        if reference and reference.startswith(PUBLIC_PATH + "/"):
+            url = asset_server.url(reference[len(PUBLIC_PATH) + 1:])
+            if url:
+                setattr(config.ui, attribute, url)
+
+
+async def static_asset_endpoint(request: Request, filename: str):
+    """Fingerprinted assets: the URL changes with the content, so they never need revalidating"""
+    entry = asset_server.by_hashed_path.get(filename)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return asset_server.respond(request, entry, IMMUTABLE)
+
+
+async def public_file_endpoint(request: Request, filename: str):
+    """public/ under its original names, precompressed and with content ETags when built"""
+    entry = asset_server.manifest.get(filename)
+    if entry is None:
+        return await serve_public_file(filename)
+    return asset_server.respond(request, entry, REVALIDATE)
+
+
+add_route(STATIC_PATH + "/{filename:path}", static_asset_endpoint, include_in_schema=False)
+add_route(PUBLIC_PATH + "/{filename:path}", public_file_endpoint, include_in_schema=False)
+
+if __name__ == "__main__":
+    built = build_assets()
+    for logical, entry in built.items():
+        print(f"{logical:<40} {entry['path']:<48} {entry['size']:>7} B  {', '.join(entry['encodings']) or '-'}")
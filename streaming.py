@@ -0,0 +1,153 @@
+import asyncio
+import contextlib
+import os
+import time
+from typing import AsyncIterable, Iterable, Optional, Union
+
+import chainlit as cl
+
+import metrics
+
+# Tokens are coalesced into one socket frame per window, or sooner once the byte budget is reached
+STREAM_FRAME_MS = float(os.environ.get("STREAM_FRAME_MS", 50))
+STREAM_FRAME_BYTES = int(os.environ.get("STREAM_FRAME_BYTES", 2048))
+# Producers wait once this much text is buffered and not yet sent
+STREAM_MAX_BUFFER_BYTES = int(os.environ.get("STREAM_MAX_BUFFER_BYTES", 64 * 1024))
+# Frames are held while more than this many packets wait in the client's socket queue
+STREAM_MAX_BACKLOG = int(os.environ.get("STREAM_MAX_BACKLOG", 16))
+# Longest a frame is held for a slow client before it is sent anyway
+STREAM_MAX_HOLD_MS = float(os.environ.get("STREAM_MAX_HOLD_MS", 2000))
+
+
+def _client_backlog() -> int:
+    """Packets queued for the current session's socket but not yet written"""
+    try:
+        from chainlit.server import sio
+
+        session = cl.context.session
+        eio_sid = sio.manager.eio_sid_from_sid(session.socket_id, "/")
+        return sio.eio.sockets[eio_sid].queue.qsize()
+    except (AttributeError, KeyError, TypeError):
+        return 0
+
+
+class TokenStream:
+    """Streams tokens into a cl.Message, coalesced into a bounded number of frames
+
+    A background flusher sends whatever has accumulated every STREAM_FRAME_MS,
+    or as soon as STREAM_FRAME_BYTES are buffered. When the client's socket is
+    backed up the flusher holds frames (tokens keep merging into the buffer),
+    and once STREAM_MAX_BUFFER_BYTES are pending `write` waits, pushing the
+    backpressure to the producer. A reply that is complete before its first
+    frame is due is sent as a plain message, without a stream.
+    """
+
+    def __init__(self, message: cl.Message):
+        self.message = message
+        self.frames = 0
+        self.tokens = 0
+        self.held_frames = 0
+        # Set once the first frame starts going out; before that the reply can still be sent whole
+        self._streaming = False
+        self._buffer: list = []
+        self._size = 0
+        self._closed = False
+        self._wake = asyncio.Event()
+        self._room = asyncio.Event()
+        self._room.set()
+        self._flusher: Optional[asyncio.Task] = None
+        self._started = time.perf_counter()
+        self._first_frame_ms: Optional[float] = None
+
+    async def write(self, token: str):
+        if not token:
+            return
+        self._buffer.append(token)
+        self._size += len(token.encode("utf-8"))
+        self.tokens += 1
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run())
+        if self._size >= STREAM_FRAME_BYTES:
+            self._wake.set()
+        while self._size >= STREAM_MAX_BUFFER_BYTES and not self._flusher.done():
+            self._room.clear()
+            await self._room.wait()
+
+    async def _run(self):
+        window = STREAM_FRAME_MS / 1000
+        while not self._closed or self._buffer:
+            if not self._closed:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), window)
+                except asyncio.TimeoutError:
+                    pass
+            self._wake.clear()
+            held = 0.0
+            while not self._closed and _client_backlog() > STREAM_MAX_BACKLOG and held < STREAM_MAX_HOLD_MS:
+                await asyncio.sleep(window)
+                held += STREAM_FRAME_MS
+            if held:
+                self.held_frames += 1
+            await self._send_frame()
+
+    async def _send_frame(self):
+        if not self._buffer:
+            return
+        text = "".join(self._buffer)
+        self._buffer.clear()
+        self._size = 0
+        self._room.set()
+        self._streaming = True
+        await self.message.stream_token(text)
+        self.frames += 1
+        if self._first_frame_ms is None:
+            self._first_frame_ms = (time.perf_counter() - self._started) * 1000
+
+    async def close(self) -> cl.Message:
+        """Flush what is left, finalize the message and record stream metrics"""
+        self._closed = True
+        if not self._streaming and self._flusher is not None:
+            # Nothing streamed yet: the whole reply goes out in the message itself
+            self._flusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+            self.message.content += "".join(self._buffer)
+            self._buffer.clear()
+        self._wake.set()
+        if self._flusher is not None:
+            await self._flusher
+        await self.message.send()
+        if self._first_frame_ms is None:
+            self._first_frame_ms = (time.perf_counter() - self._started) * 1000
+        metrics.record_stream(self._first_frame_ms, self.frames, self.tokens, self.held_frames)
+        return self.message
+
+    async def __aenter__(self) -> "TokenStream":
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        if exc_type is not None and self._flusher is not None:
+            # The producer failed: finalize with what was already sent
+            self._flusher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._flusher
+            self._flusher = None
+            self._buffer.clear()
+        await self.close()
+
+
+async def stream_message(tokens: Union[str, Iterable[str], AsyncIterable[str]], **message_kwargs) -> cl.Message:
+    """Send a reply, streaming it through a TokenStream when it is produced over time
+
+    `tokens` may be an async iterator, e.g. an LLM response, which is
+    streamed. A string or an iterable of tokens is already complete, so it
+    is sent as one message: streaming it would only send it twice.
+    """
+    if not hasattr(tokens, "__aiter__"):
+        text = tokens if isinstance(tokens, str) else "".join(tokens)
+        return await cl.Message(content=text, **message_kwargs).send()
+    async with TokenStream(cl.Message(content="", **message_kwargs)) as stream:
+        async for token in tokens:
+            await stream.write(token)
+    return stream.message
@@ -0,0 +1,135 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from chainlit.config import config, config_translation_dir
+from chainlit.server import _language_pattern
+from fastapi import Query, Request
+from starlette.responses import JSONResponse, Response
+
+from server_routes import add_route
+
+logger = logging.getLogger(__name__)
+
+# Compiled locales kept in memory, and how long an unused one is kept
+TRANSLATIONS_MAX_LOCALES = int(os.environ.get("TRANSLATIONS_MAX_LOCALES", 4))
+TRANSLATIONS_IDLE_SECONDS = float(os.environ.get("TRANSLATIONS_IDLE_SECONDS", 1800))
+
+TRANSLATIONS_PATH = "/project/translations"
+DEFAULT_LANGUAGE = "en-US"
+
+
+class TranslationBundle:
+    """One locale file, compiled to its response body, plain and gzipped
+
+    No flat key -> template table is kept: the frontend's i18next does the
+    key lookup and {{slot}} interpolation itself, and nothing on the server
+    translates strings, so a precompiled table would only cost memory.
+    """
+
+    __slots__ = ("path", "mtime", "etag", "body", "gzipped", "used")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+        with open(path, encoding="utf-8") as f:
+            nested = json.load(f)
+        self.body = json.dumps({"translation": nested}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.gzipped = gzip.compress(self.body, 9, mtime=0)
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:16]}"'
+        self.used = time.monotonic()
+
+
+class TranslationCatalog:
+    """Locales compiled on first request and dropped when nobody uses them
+
+    Resolves a requested language to a file the same way Chainlit does
+    (exact, parent, regional variant, then en-US), so cached bundles are
+    shared by every language that falls back to the same file.
+    """
+
+    def __init__(self, directory: str, max_locales: int, idle_seconds: float):
+        self.directory = directory
+        self.max_locales = max_locales
+        self.idle_seconds = idle_seconds
+        self._bundles: "OrderedDict[str, TranslationBundle]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "compiled": 0, "evicted": 0}
+
+    def resolve(self, language: str) -> Optional[str]:
+        """Path of the locale file serving `language`"""
+        parent = language.split("-")[0]
+        candidates = [f"{language}.json", f"{parent}.json"]
+        if language == parent:
+            try:
+                candidates += sorted(name for name in os.listdir(self.directory) if name.startswith(f"{parent}-") and name.endswith(".json"))
+            except OSError:
+                pass
+        candidates.append(f"{DEFAULT_LANGUAGE}.json")
+        for name in candidates:
+            path = os.path.join(self.directory, name)
+            if os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.directory) and os.path.isfile(path):
+                return path
+        return None
+
+    def bundle(self, language: str) -> Optional[TranslationBundle]:
+        path = self.resolve(language)
+        if path is None:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            bundle = self._bundles.get(path)
+            if bundle is not None and bundle.mtime == os.stat(path).st_mtime_ns:
+                self._bundles.move_to_end(path)
+                self.counters["hits"] += 1
+            else:
+                bundle = self._bundles[path] = TranslationBundle(path)
+                self._bundles.move_to_end(path)
+                self.counters["compiled"] += 1
+            bundle.used = now
+            for key in [key for key, other in self._bundles.items() if now - other.used > self.idle_seconds]:
+                del self._bundles[key]
+                self.counters["evicted"] += 1
+            while len(self._bundles) > self.max_locales:
+                self._bundles.popitem(last=False)
+                self.counters["evicted"] += 1
+        return bundle
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "locales": len(self._bundles),
+            "bytes": sum(len(bundle.body) + len(bundle.gzipped) for bundle in self._bundles.values()),
+            **self.counters,
+        }
+
+
+translation_catalog = TranslationCatalog(config_translation_dir, TRANSLATIONS_MAX_LOCALES, TRANSLATIONS_IDLE_SECONDS)
+
+
+async def translations_endpoint(request: Request, language: str = Query(default=DEFAULT_LANGUAGE, pattern=_language_pattern)):
+    """Chainlit's translations endpoint, served from the compiled bundle with an ETag"""
+    try:
+        bundle = await asyncio.to_thread(translation_catalog.bundle, config.ui.language or language)
+    except (OSError, ValueError):
+        logger.exception("Loading translations for %s failed", language)
+        bundle = None
+    if bundle is None:
+        return JSONResponse({"translation": {}})
+
+    headers = {"ETag": bundle.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if bundle.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        headers["Content-Encoding"] = "gzip"
+        return Response(bundle.gzipped, media_type="application/json", headers=headers)
+    return Response(bundle.body, media_type="application/json", headers=headers)
+
+
+add_route(TRANSLATIONS_PATH, translations_endpoint, include_in_schema=False)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from file_utils import file_digest, write_atomically
+
+CACHE_DIR = os.environ.get("UPLOAD_CACHE_DIR", ".files/.upload_cache")
+CACHE_MEMORY_BYTES = int(os.environ.get("UPLOAD_CACHE_MEMORY_MB", 64)) * 1024 * 1024
+CACHE_DISK_BYTES = int(os.environ.get("UPLOAD_CACHE_DISK_MB", 512)) * 1024 * 1024
+
+
+def cache_key(path: str, *parts: Any) -> str:
+    """Key for an artifact derived from the file content plus processing parameters"""
+    key = "|".join([file_digest(path), *(str(part) for part in parts)])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class UploadCache:
+    """Content-addressed LRU cache of processed upload artifacts
+
+    Artifacts are small JSON-able dicts (detected kind, preview, metadata).
+    They live in an in-memory LRU bounded by `memory_bytes` and are written
+    through to `directory`, whose total size is bounded by `disk_bytes`.
+    Access is thread-safe since uploads are processed on a worker pool.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, memory_bytes: int = CACHE_MEMORY_BYTES, disk_bytes: int = CACHE_DISK_BYTES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._memory_used = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_used = 0
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "memory_evictions": 0, "disk_evictions": 0}
+        self._load_disk_index()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU order from file modification times"""
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith(".json"):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, name[:-5], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_used += size
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached artifact for `key`, or None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters["memory_hits"] += 1
+                return self._memory[key][0]
+            if key not in self._disk:
+                self._counters["misses"] += 1
+                return None
+            self._disk.move_to_end(key)
+
+        try:
+            with open(self._path(key), "rb") as f:
+                raw = f.read()
+            artifact = json.loads(raw)
+            os.utime(self._path(key))
+        except (OSError, ValueError):
+            # Missing, unreadable or truncated (e.g. by a crash): a miss, and the entry goes
+            with self._lock:
+                self._drop_disk(key)
+                self._counters["misses"] += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+
+        with self._lock:
+            self._counters["disk_hits"] += 1
+            self._remember(key, artifact, len(raw))
+        return artifact
+
+    def put(self, key: str, artifact: Dict[str, Any]):
+        """Store an artifact in memory and on disk, evicting least recently used entries"""
+        raw = json.dumps(artifact, ensure_ascii=False)
+        size = len(raw.encode("utf-8"))
+        with self._lock:
+            self._remember(key, artifact, size)
+
+        if size > self.disk_bytes:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomically(path, raw)
+        except OSError:
+            return
+        with self._lock:
+            self._drop_disk(key)
+            self._disk[key] = size
+            self._disk_used += size
+            while self._disk_used > self.disk_bytes and self._disk:
+                oldest = next(iter(self._disk))
+                self._drop_disk(oldest)
+                self._counters["disk_evictions"] += 1
+                try:
+                    os.remove(self._path(oldest))
+                except OSError:
+                    pass
+
+    def _remember(self, key: str, artifact: Dict[str, Any], size: int):
+        """Insert into the memory LRU; caller holds the lock"""
+        if key in self._memory:
+            self._memory_used -= self._memory.pop(key)[1]
+        if size > self.memory_bytes:
+            return
+        self._memory[key] = (artifact, size)
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_used -= evicted_size
+            self._counters["memory_evictions"] += 1
+
+    def _drop_disk(self, key: str):
+        """Forget a disk entry; caller holds the lock"""
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_used -= size
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and current usage, for sizing the budgets"""
+        with self._lock:
+            return {
+                **self._counters,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_used,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_used,
+            }
+
+
+upload_cache = UploadCache()
@@ -0,0 +1,184 @@
+import asyncio
+import codecs
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+
+from sniffing import sniff_upload, ASCII_COMPATIBLE
+from upload_cache import upload_cache, cache_key
+
+logger = logging.getLogger(__name__)
+
+# Preview limits for text/JSON uploads (overridable through the environment)
+PREVIEW_MAX_BYTES = int(os.environ.get("UPLOAD_PREVIEW_MAX_BYTES", 64 * 1024))
+PREVIEW_MAX_LINES = int(os.environ.get("UPLOAD_PREVIEW_MAX_LINES", 500))
+READ_CHUNK_SIZE = 64 * 1024
+
+# Blocking upload work runs on a small dedicated pool; the global limit caps how
+# many files from all sessions may be queued or running at once
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", 4))
+UPLOAD_MAX_CONCURRENCY = int(os.environ.get("UPLOAD_MAX_CONCURRENCY", 8))
+
+_executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+_upload_slots = asyncio.Semaphore(UPLOAD_MAX_CONCURRENCY)
+
+TRUNCATED_MARKER = "\n\n… [truncated: showing {shown_lines:,} of {lines:,} lines, {shown_size} of {size}]"
+
+
+def format_size(num_bytes: int) -> str:
+    """Human readable byte count"""
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _preview_cut(piece: bytes, max_lines: int) -> int:
+    """Return the end offset of `piece` that keeps at most `max_lines` line breaks"""
+    index = -1
+    for _ in range(max_lines):
+        index = piece.find(b"\n", index + 1)
+        if index == -1:
+            return len(piece)
+    return index + 1
+
+
+def build_text_preview(path: str, max_bytes: int = PREVIEW_MAX_BYTES, max_lines: int = PREVIEW_MAX_LINES, encoding: str = "utf-8") -> Dict[str, Any]:
+    """Stream a text file in bounded chunks and return a capped preview with size stats
+
+    `encoding` must be ASCII compatible. Raises UnicodeDecodeError if the file
+    does not decode, like a full read would.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    preview = bytearray()
+    preview_lines = 0
+    preview_full = False
+    size = 0
+    lines = 0
+    last_byte = b""
+
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_CHUNK_SIZE):
+            # Validate the encoding chunk by chunk without keeping the output
+            decoder.decode(chunk)
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+            last_byte = chunk[-1:]
+
+            if not preview_full:
+                piece = chunk[:max_bytes - len(preview)]
+                piece = piece[:_preview_cut(piece, max_lines - preview_lines)]
+                preview += piece
+                preview_lines += piece.count(b"\n")
+                preview_full = len(preview) >= max_bytes or preview_lines >= max_lines
+        decoder.decode(b"", final=True)
+
+    if last_byte and last_byte != b"\n":
+        lines += 1
+    truncated = size > len(preview)
+    if preview and not preview.endswith(b"\n"):
+        preview_lines += 1
+
+    return {
+        # A byte cut may split a multi-byte character at the very end
+        "text": preview.decode(encoding, errors="ignore"),
+        "truncated": truncated,
+        "size": size,
+        "lines": lines,
+        "shown_size": len(preview),
+        "shown_lines": preview_lines,
+    }
+
+
+def format_text_preview(preview: Dict[str, Any]) -> str:
+    """Render a preview dict as sidebar text, appending a marker when truncated"""
+    if not preview["truncated"]:
+        return preview["text"]
+    return preview["text"] + TRUNCATED_MARKER.format(
+        shown_lines=preview["shown_lines"],
+        lines=preview["lines"],
+        shown_size=format_size(preview["shown_size"]),
+        size=format_size(preview["size"]),
+    )
+
+
+def detect_kind(mime: Optional[str]) -> str:
+    """Map an upload MIME type to the sidebar element kind"""
+    if mime and mime.startswith('image/'):
+        return "image"
+    if mime == 'application/pdf':
+        return "pdf"
+    if mime and (mime.startswith('text/') or 'json' in mime):
+        return "text"
+    return "file"
+
+
+def inspect_upload(name: str, path: str, mime: Optional[str]) -> Dict[str, Any]:
+    """Blocking part of upload processing: type routing, file I/O and decoding
+
+    The handler is chosen from the file's first bytes, so a mislabeled file
+    costs one small read. Decoded artifacts are cached by content hash, so a
+    repeated upload of the same document skips decoding entirely.
+    """
+    result = {"name": name, "path": path, "mime": mime, "declared_mime": mime, "kind": "file", "cached": False}
+    try:
+        sniffed = sniff_upload(path, mime)
+    except OSError:
+        return result
+    result.update(sniffed)
+    encoding = sniffed["encoding"]
+    result["kind"] = detect_kind(sniffed["mime"])
+    if result["kind"] == "file" and encoding in ASCII_COMPATIBLE:
+        result["kind"] = "text"
+    if result["kind"] == "text" and encoding not in ASCII_COMPATIBLE:
+        result["kind"] = "file"
+    if result["kind"] != "text":
+        return result
+
+    try:
+        key = cache_key(path, encoding, PREVIEW_MAX_BYTES, PREVIEW_MAX_LINES)
+    except OSError:
+        result["kind"] = "file"
+        return result
+    artifact = upload_cache.get(key)
+    if artifact is not None:
+        result.update(artifact, cached=True)
+        return result
+
+    try:
+        artifact = {"kind": "text", "preview": build_text_preview(path, encoding=encoding)}
+    except (OSError, UnicodeDecodeError):
+        artifact = {"kind": "file"}
+    upload_cache.put(key, artifact)
+    result.update(artifact)
+    return result
+
+
+async def process_uploads(files: List[Any]) -> List[Dict[str, Any]]:
+    """Inspect all files of a message concurrently on the upload pool
+
+    Results keep the order of `files` and carry per-file timings
+    (`wait_ms` queued for a slot, `work_ms` spent in the pool).
+    """
+    loop = asyncio.get_running_loop()
+
+    async def run(file) -> Dict[str, Any]:
+        queued = time.perf_counter()
+        async with _upload_slots:
+            started = time.perf_counter()
+            result = await loop.run_in_executor(_executor, inspect_upload, file.name, file.path, file.mime)
+        finished = time.perf_counter()
+        result["wait_ms"] = (started - queued) * 1000
+        result["work_ms"] = (finished - started) * 1000
+        logger.debug(
+            "Processed upload %s (%s%s) in %.1f ms after %.1f ms queued",
+            file.name, result["kind"], ", cached" if result["cached"] else "",
+            result["work_ms"], result["wait_ms"],
+        )
+        return result
+
+    return await asyncio.gather(*(run(file) for file in files))